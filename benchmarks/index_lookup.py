@@ -0,0 +1,85 @@
+"""Token and per-user listing lookup latency with and without the revision 2 indexes.
+
+    python benchmarks/index_lookup.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from migrations.versions import v0001_initial, v0002_lookup_indexes
+
+def measure(connection, sql, params, runs):
+    timings = []
+    for param in params[:runs]:
+        start = time.perf_counter()
+        connection.execute(text(sql), param).fetchall()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p99_ms": timings[int(len(timings) * 0.99)] * 1000,
+    }
+
+def seed(connection, rows):
+    tokens = []
+    base = datetime(2024, 1, 1)
+    batch_users, batch_blogs = [], []
+    for i in range(1, rows + 1):
+        token = str(uuid.uuid4())
+        if i % 1000 == 0:
+            tokens.append(token)
+        batch_users.append({"user_id": i, "email": f"user{i}@example.com", "username": f"user{i}", "password": "x", "access_token": token})
+        batch_blogs.append({"id": i, "user_id": random.randint(1, max(rows // 50, 1)), "title": f"title {i}", "content": "", "created_at": base + timedelta(seconds=i)})
+        if len(batch_users) == 10000:
+            connection.execute(text("INSERT INTO chat_users (user_id, email, username, password, access_token) VALUES (:user_id, :email, :username, :password, :access_token)"), batch_users)
+            connection.execute(text("INSERT INTO blogs (id, user_id, title, content, created_at) VALUES (:id, :user_id, :title, :content, :created_at)"), batch_blogs)
+            batch_users, batch_blogs = [], []
+    if batch_users:
+        connection.execute(text("INSERT INTO chat_users (user_id, email, username, password, access_token) VALUES (:user_id, :email, :username, :password, :access_token)"), batch_users)
+        connection.execute(text("INSERT INTO blogs (id, user_id, title, content, created_at) VALUES (:id, :user_id, :title, :content, :created_at)"), batch_blogs)
+    connection.commit()
+    return tokens
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--url", default=None, help="Defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        v0001_initial.upgrade(connection)
+        connection.commit()
+        print(f"Seeding {args.rows} users and blogs...")
+        tokens = seed(connection, args.rows)
+        token_params = [{"token": token} for token in tokens] * (args.runs // max(len(tokens), 1) + 1)
+        user_params = [{"user_id": random.randint(1, max(args.rows // 50, 1))} for _ in range(args.runs)]
+        queries = {
+            "token lookup": ("SELECT * FROM chat_users WHERE access_token = :token", token_params),
+            "blogs by user": ("SELECT id, title, created_at FROM blogs WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 20", user_params),
+        }
+        before = {name: measure(connection, sql, params, args.runs) for name, (sql, params) in queries.items()}
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        v0002_lookup_indexes.upgrade(connection)
+    with engine.connect() as connection:
+        after = {name: measure(connection, sql, params, args.runs) for name, (sql, params) in queries.items()}
+
+    for name in queries:
+        print(f"{name:14} no index: mean {before[name]['mean_ms']:.3f} ms, p99 {before[name]['p99_ms']:.3f} ms | "
+              f"indexed: mean {after[name]['mean_ms']:.3f} ms, p99 {after[name]['p99_ms']:.3f} ms")
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
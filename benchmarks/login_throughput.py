@@ -0,0 +1,61 @@
+"""Concurrent password verification: inline on the event loop vs. the PasswordHasher thread pool.
+
+Reports logins/s and the worst event-loop stall seen by a 1 ms ticker while the logins run.
+
+    python benchmarks/login_throughput.py --logins 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.password_hasher import PasswordHasher
+
+async def ticker(stop, worst):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        worst[0] = max(worst[0], time.perf_counter() - start - 0.001)
+
+async def run(name, verify, logins, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    stop, worst = asyncio.Event(), [0.0]
+    tick = asyncio.create_task(ticker(stop, worst))
+
+    async def login():
+        async with semaphore:
+            matches, _ = await verify()
+            assert matches
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    print(f"{name:9} {logins / elapsed:8.1f} logins/s, worst loop stall {worst[0] * 1000:8.1f} ms")
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--n", type=int, default=2 ** 14)
+    args = parser.parse_args()
+
+    hasher = PasswordHasher(n=args.n, workers=args.workers)
+    stored = hasher.hash_sync("correct horse battery staple")
+
+    async def inline():
+        return hasher.verify_sync("correct horse battery staple", stored)
+
+    async def pooled():
+        return await hasher.verify("correct horse battery staple", stored)
+
+    await run("inline", inline, args.logins, args.concurrency)
+    await run("executor", pooled, args.logins, args.concurrency)
+    hasher.executor.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
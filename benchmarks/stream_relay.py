@@ -0,0 +1,81 @@
+"""Streaming relay: the old aiter_text + sleep(0.1) loop against the aiter_raw pass-through, with
+and without chunk coalescing. Reports time to first byte, total time and writes per stream
+against a local upstream that sends one SSE event every --interval-ms.
+
+    python benchmarks/stream_relay.py --events 200 --interval-ms 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils.llm_provider as llm_provider
+from utils.llm_provider import LLMProvider
+
+async def upstream(reader, writer, events, interval):
+    # Minimal HTTP/1.1 server answering every request with a chunked SSE stream
+    headers = await reader.readuntil(b"\r\n\r\n")
+    length = next((int(line.split(b":")[1]) for line in headers.split(b"\r\n") if line.lower().startswith(b"content-length")), 0)
+    await reader.readexactly(length)
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+    for i in range(events):
+        event = f"data: {json.dumps({'choices': [{'delta': {'content': f'token {i}'}}]})}\n\n".encode()
+        writer.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+        await writer.drain()
+        await asyncio.sleep(interval)
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+    writer.close()
+
+class Controller:
+    def __init__(self, client):
+        self.client = client
+
+async def legacy_relay(client, url, payload):
+    async with client.stream("POST", url, json=payload) as response:
+        async for chunk in response.aiter_text():
+            yield chunk
+            await asyncio.sleep(0.1)
+
+async def measure(name, body):
+    start = time.perf_counter()
+    first, writes = None, 0
+    async for _ in body:
+        if first is None:
+            first = time.perf_counter() - start
+        writes += 1
+    total = time.perf_counter() - start
+    print(f"{name:22} first byte {first * 1000:8.1f} ms, total {total:7.2f} s, {writes:5d} writes")
+
+async def run(events, interval, legacy):
+    server = await asyncio.start_server(lambda r, w: upstream(r, w, events, interval), "127.0.0.1", 0)
+    url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/chat/completions"
+    payload = {"model": "bench", "stream": True}
+    async with httpx.AsyncClient(timeout=60) as client:
+        provider = LLMProvider(Controller(client))
+        if legacy:
+            await measure("aiter_text + sleep", legacy_relay(client, url, payload))
+
+        async def relayed():
+            response = await provider.common_request(url, {}, payload, True)
+            async for chunk in response.body_iterator:
+                yield chunk
+        await measure("aiter_raw", relayed())
+        llm_provider.STREAM_COALESCE_BYTES, llm_provider.STREAM_COALESCE_SECONDS = 4096, 0.02
+        await measure("aiter_raw, coalesced", relayed())
+    server.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    parser.add_argument("--skip-legacy", action="store_true", help="The legacy relay takes events x 0.1 s")
+    args = parser.parse_args()
+    asyncio.run(run(args.events, args.interval_ms / 1000, not args.skip_legacy))
+
+if __name__ == "__main__":
+    main()
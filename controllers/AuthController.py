@@ -1,85 +1,134 @@
+import logging
 from controllers.BaseController import BaseController
-import hashlib
-from fastapi import HTTPException
+from fastapi import HTTPException, Depends, Request
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 from models import UserResponse, CommonResponse, UserCreate, UserLogin
 import uuid
 from database import User
+from utils.password_hasher import password_hasher
+from utils.rate_limiter import limiter_from_env, enforce
+from utils.session_store import session_store
+import os
+from sqlalchemy import select, update
+from utils.dialect_insert import dialect_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# What the auth responses and the token cache need, returned straight from INSERT/UPDATE
+TOKEN_COLUMNS = (User.user_id, User.email, User.username, User.access_token, User.token_expire_date)
+
+# Shared buckets let a burst spread over several workers still hit one limit
+rate_limit_store = session_store if os.environ.get("AUTH_RATE_LIMIT_SHARED", "false").lower() == "true" else None
 
 class AuthController(BaseController):
 
+    password_hasher = password_hasher
+    # Checked before any query so credential-stuffing bursts never reach the database
+    ip_limiter = limiter_from_env("auth_ip", 30, 10, rate_limit_store)
+    email_limiter = limiter_from_env("auth_email", 5, 5, rate_limit_store)
+
     def setup(self):
         app = self.app
         @app.post("/signup/")
-        def signup(user: UserCreate):
-            return self.signup(user.email, user.username, user.password)
+        async def signup(request: Request, user: UserCreate, session: AsyncSession = Depends(self.manager.get_session)):
+            await self.rate_limit("signup", request, user.email)
+            return await self.signup(session, user.email, user.username, user.password)
 
         @app.post("/login/")
-        def login(user: UserLogin):
-            return self.login(user.email, user.password)
+        async def login(request: Request, user: UserLogin, session: AsyncSession = Depends(self.manager.get_session)):
+            await self.rate_limit("login", request, user.email)
+            return await self.login(session, user.email, user.password)
 
-    def hash_password(self, password):
-        return hashlib.sha256(password.encode()).hexdigest()
+        @app.get("/auth/token-cache/stats/")
+        async def token_cache_stats():
+            return CommonResponse(message="", data=self.token_cache.stats())
 
-    def signup(self, email, username, password):
-        session = self.manager.Session()
-        # Check if the email already exists
-        existing_user = session.query(User).filter(User.email == email).first()
-        if existing_user:
-            raise HTTPException(status_code=400, detail="Email already exists.")
-        access_token = str(uuid.uuid4())
-        new_user = User(
+        @app.get("/auth/rate-limit/stats/")
+        async def rate_limit_stats():
+            return CommonResponse(message="", data={"ip": self.ip_limiter.stats(), "email": self.email_limiter.stats()})
+
+    async def rate_limit(self, action, request, email):
+        # Behind a proxy run uvicorn with --proxy-headers so client.host is the caller's address
+        ip = request.client.host if request.client else "unknown"
+        await enforce((self.ip_limiter, f"{action}:{ip}"), (self.email_limiter, f"{action}:{email.strip().lower()}"))
+
+    async def hash_password(self, password):
+        return await self.password_hasher.hash(password)
+
+    async def signup(self, session, email, username, password):
+        now = datetime.now()
+        expire_date = now + timedelta(days=1) # Set token expire date to 1 day from now
+        # The unique email index replaces the existence check: a taken email inserts nothing and returns no row
+        statement = dialect_insert(session, User).values(
             email=email,
             username=username,
-            password=self.hash_password(password),
-            access_token=access_token,
-            token_expire_date=datetime.now() + timedelta(days=1), # Set token expire date to 1 day from now
-            created_at=datetime.now()  # Set created_at to current UTC time
-        )
+            password=await self.hash_password(password),
+            access_token=str(uuid.uuid4()),
+            token_expire_date=expire_date,
+            created_at=now
+        ).on_conflict_do_nothing(index_elements=[User.email]).returning(*TOKEN_COLUMNS)
         try:
-            session.add(new_user)
-            session.commit()
-            session.refresh(new_user) 
+            new_user = (await session.execute(statement)).first()
+            if new_user is None:
+                await session.rollback()
+                raise HTTPException(status_code=400, detail="Email already exists.")
+            if self.token_signer:
+                # Signed tokens embed the user id, which only exists after the insert
+                new_user = await self.update_token(session, new_user.user_id, self.issue_token(new_user.user_id, email, username, expire_date), expire_date)
+            await session.commit()
+            await self.remember_token(new_user)
             data = UserResponse(user_id=new_user.user_id, email=new_user.email, username=new_user.username,access_token=new_user.access_token)
             return CommonResponse(message="User signed up successfully!", data=data)
         except IntegrityError:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(status_code=400, detail="Email or username already exists.")
-        finally:
-            session.close()
 
-    def login(self, email, password):
-        session = self.manager.Session()
-        user = session.query(User).filter_by(email=email).first()
+    async def login(self, session, email, password):
+        # The salted hash can only be checked in Python, so the password has to be read first
+        result = await session.execute(select(User.user_id, User.email, User.username, User.password, User.access_token).filter_by(email=email))
+        user = result.first()
         try:
-            if user and user.password == self.hash_password(password):
-                user.access_token = str(uuid.uuid4())
+            matches, needs_rehash = await self.password_hasher.verify(password, user.password) if user else (False, False)
+            if matches:
+                # Upgrade legacy sha256 and outdated scrypt hashes while we have the plain password
+                new_password = await self.hash_password(password) if needs_rehash else None
                 # TBD Check token_expire_date
-                user.token_expire_date=datetime.now() + timedelta(days=1)
+                expire_date = datetime.now() + timedelta(days=1)
+                access_token = self.issue_token(user.user_id, user.email, user.username, expire_date)
+                updated = await self.update_token(session, user.user_id, access_token, expire_date, password=new_password)
                 # Commit the change to the database
-                session.commit()
-                data = UserResponse(user_id=user.user_id, email=user.email, username=user.username,access_token=user.access_token)
+                await session.commit()
+                # The previous token stops working as soon as a new one is issued
+                await self.revoke_token(user.access_token)
+                await self.remember_token(updated)
+                data = UserResponse(user_id=updated.user_id, email=updated.email, username=updated.username,access_token=updated.access_token)
                 return CommonResponse(message="User login successfully!", data=data)
             else:
                 raise HTTPException(status_code=401, detail="Invalid email or password.")
         except IntegrityError:
-            print("Error: Email or username already exists.")
+            logger.warning("Login hit an integrity error for %s", email)
             raise HTTPException(status_code=400, detail="Email or username already exists.")
-        finally:
-            session.close() 
 
-    def find_password_by_email(self, email):
-        session = self.manager.Session()
-        user = session.query(User).filter_by(email=email).first()
+    async def update_token(self, session, user_id, access_token, expire_date, password=None):
+        values = {"access_token": access_token, "token_expire_date": expire_date}
+        if password is not None:
+            values["password"] = password
+        # One UPDATE ... RETURNING instead of loading the row into the session and flushing it
+        statement = update(User).where(User.user_id == user_id).values(**values).returning(*TOKEN_COLUMNS)
+        result = await session.execute(statement.execution_options(synchronize_session=False))
+        return result.first()
+
+    async def find_password_by_email(self, session, email):
+        result = await session.execute(select(User).filter_by(email=email))
+        user = result.scalars().first()
         try:
             if user:
                 # Here, implement your email sending logic
                 return {"message": f"Password recovery email sent to {email}."}
             else:
-                print("No user found with that email.")
+                logger.info("No user found with that email.")
                 return {"message": "No user found with that email."}
         except IntegrityError:
             raise HTTPException(status_code=400, detail="Email or username already exists.")
-        finally:
-            session.close()
\ No newline at end of file
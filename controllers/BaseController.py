@@ -1,35 +1,136 @@
+import logging
 from database import User
 from fastapi import HTTPException
+from sqlalchemy import select
+from utils.token_cache import token_cache, CachedUser
+from utils.session_store import session_store
+from utils.signed_token import token_signer, revocation_list, is_signed_token
+from datetime import datetime
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+# An unreachable store fails every request, so only a sample of the errors is logged
+STORE_ERROR_SAMPLE_RATE = 0.01
 
 class BaseController:
 
+    # Shared by every controller in the process so a token is looked up in the database once per TTL
+    token_cache = token_cache
+    # Shared by every worker pointed at the same backend, so tokens validate without a database query
+    session_store = session_store
+    # Set when ACCESS_TOKEN_SECRET is configured: tokens are then verified without any lookup
+    token_signer = token_signer
+    revocation_list = revocation_list
+
     def __init__(self, app, manager):
         self.app = app
         self.manager = manager
 
-    def authenticate_with_api_key(self, access_token, session = None):
-        if session is None:
-            session = self.manager.Session()
-        # Check if the email already exists
-        user = session.query(User).filter(User.access_token == access_token).first()
+    async def authenticate_with_api_key(self, access_token, session = None):
+        user = self.token_cache.get(access_token)
         if user:
             return user
-        return None
-    
-    def authenticate(self, user_id, access_token, session = None):
-        if session is None:
-            session = self.manager.Session()
-        # Check if the email already exists
-        user = session.query(User).filter(User.user_id == user_id, User.access_token == access_token).first()
+        if self.token_signer and is_signed_token(access_token):
+            user = await self.verify_signed_token(access_token)
+            return self.token_cache.put(user) if user else None
+        user = await self.load_token(access_token)
         if user:
+            return self.token_cache.put(user)
+        if session is None:
+            async with self.manager.session_scope() as session:
+                return await self.query_token(access_token, session)
+        return await self.query_token(access_token, session)
+
+    # The database fallback once the token cache and session store have both missed
+    async def query_token(self, access_token, session):
+        result = await session.execute(select(User).filter(User.access_token == access_token))
+        user = result.scalars().first()
+        if not user:
+            return None
+        user = CachedUser.from_user(user)
+        # Expired tokens are refused here as in the cache and the session store
+        seconds_left = user.seconds_left()
+        if seconds_left is not None and seconds_left <= 0:
+            return None
+        user = self.token_cache.put(user)
+        await self.remember_token(user)
+        return user
+
+    async def authenticate(self, user_id, access_token, session = None):
+        user = await self.authenticate_with_api_key(access_token, session=session)
+        if user and user.user_id == user_id:
             return user
         return None
-    
+
+    async def verify_signed_token(self, access_token):
+        payload = self.token_signer.verify(access_token)
+        if payload is None or self.revocation_list.is_revoked(payload["jti"]):
+            return None
+        # Revocations made by other workers are published through the session store
+        try:
+            if await self.session_store.get(f"revoked:{payload['jti']}") is not None:
+                self.revocation_list.revoke(payload["jti"], payload["exp"])
+                return None
+        except Exception as e:
+            logger.warning("Session store error: %s", e, extra={"sample_rate": STORE_ERROR_SAMPLE_RATE})
+        return CachedUser(payload["uid"], payload["email"], payload["name"], access_token, datetime.fromtimestamp(payload["exp"]))
+
+    def issue_token(self, user_id, email, username, expires_at):
+        if self.token_signer:
+            return self.token_signer.issue(user_id, email, username, expires_at)
+        return str(uuid.uuid4())
+
+    # The session store is an optimisation: if it is unreachable, auth falls back to the database
+    async def load_token(self, access_token):
+        try:
+            data = await self.session_store.get(f"token:{access_token}")
+        except Exception as e:
+            logger.warning("Session store error: %s", e, extra={"sample_rate": STORE_ERROR_SAMPLE_RATE})
+            return None
+        if data is None:
+            return None
+        user = CachedUser.from_json(data)
+        # Never trust a record filed under another token, whatever the store handed back
+        if user.access_token != access_token:
+            return None
+        seconds_left = user.seconds_left()
+        if seconds_left is not None and seconds_left <= 0:
+            return None
+        return user
+
+    async def remember_token(self, user):
+        user = user if isinstance(user, CachedUser) else CachedUser.from_user(user)
+        # Signed tokens carry everything needed to validate them
+        if is_signed_token(user.access_token):
+            return
+        seconds_left = user.seconds_left()
+        if seconds_left is not None and seconds_left <= 0:
+            return
+        try:
+            await self.session_store.set(f"token:{user.access_token}", user.to_json(), seconds_left or self.token_cache.ttl)
+        except Exception as e:
+            logger.warning("Session store error: %s", e, extra={"sample_rate": STORE_ERROR_SAMPLE_RATE})
+
+    # Revoked everywhere once each worker's token cache entry expires (at most TOKEN_CACHE_TTL)
+    async def revoke_token(self, access_token):
+        self.token_cache.invalidate(access_token)
+        try:
+            if self.token_signer and is_signed_token(access_token):
+                payload = self.token_signer.verify(access_token)
+                if payload:
+                    self.revocation_list.revoke(payload["jti"], payload["exp"])
+                    await self.session_store.set(f"revoked:{payload['jti']}", "1", payload["exp"] - time.time())
+            else:
+                await self.session_store.delete(f"token:{access_token}")
+        except Exception as e:
+            logger.warning("Session store error: %s", e, extra={"sample_rate": STORE_ERROR_SAMPLE_RATE})
+
     def raise_401(self):
         raise HTTPException(401, detail="You don't have permission.")
 
     def raise_404(self):
         raise HTTPException(404, detail="Not found")
-    
+
     def setup(self):
-        pass
\ No newline at end of file
+        pass
@@ -1,10 +1,17 @@
+import logging
 from fastapi import HTTPException
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from controllers.BaseController import BaseController
-from models import BlogModel, BlogDeleteModel, BlogEditModel, BlogResponse, CommonResponse
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_EXCERPT_LENGTH, decode_cursor, keyset_page, split_page
+from models import BlogModel, BlogBulkModel, BlogDeleteModel, BlogEditModel, BlogResponse, BlogSummaryResponse, CommonResponse
 from database import Blog
-from fastapi import Header, HTTPException
+from fastapi import Header, HTTPException, Depends, Query
+from typing import Optional
+
+logger = logging.getLogger(__name__)
 
 class BlogController(BaseController):
 
@@ -12,33 +19,36 @@ class BlogController(BaseController):
         app = self.app
         
         @app.post("/blogs/", response_model=CommonResponse)
-        async def create_blog(blog: BlogModel, API_KEY: str = Header(...)):
-            return self.create_blog(blog=blog, access_token=API_KEY)
+        async def create_blog(blog: BlogModel, API_KEY: str = Header(...), session: AsyncSession = Depends(self.manager.get_session)):
+            return await self.create_blog(session=session, blog=blog, access_token=API_KEY)
         
+        @app.post("/blogs/bulk/", response_model=CommonResponse)
+        async def create_blogs(blogs: BlogBulkModel, API_KEY: str = Header(...), session: AsyncSession = Depends(self.manager.get_session)):
+            return await self.create_blogs(session=session, blogs=blogs, access_token=API_KEY)
+
         @app.post("/blogs/edit/", response_model=CommonResponse)
-        async def edit_blog(blog: BlogEditModel, API_KEY: str = Header(...)):
-            return self.edit_blog(blog=blog, access_token=API_KEY)
+        async def edit_blog(blog: BlogEditModel, API_KEY: str = Header(...), session: AsyncSession = Depends(self.manager.get_session)):
+            return await self.edit_blog(session=session, blog=blog, access_token=API_KEY)
         
         @app.post("/blogs/delete/", response_model=CommonResponse)
-        async def delete_blog(blog: BlogDeleteModel, API_KEY: str = Header(...)):
-            return self.delete_blog(blog=blog, access_token=API_KEY)
+        async def delete_blog(blog: BlogDeleteModel, API_KEY: str = Header(...), session: AsyncSession = Depends(self.manager.get_session)):
+            return await self.delete_blog(session=session, blog=blog, access_token=API_KEY)
         
         @app.post("/blogs/user/{user_id}", response_model=CommonResponse)
-        async def get_blogs_by_user(user_id: int):
-            return self.get_blogs_by_user(user_id=user_id)
+        async def get_blogs_by_user(user_id: int, cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), fields: str = Query("full", pattern="^(full|summary)$"), excerpt: int = Query(0, ge=0, le=MAX_EXCERPT_LENGTH), session: AsyncSession = Depends(self.manager.get_read_session)):
+            return await self.get_blogs_by_user(session=session, user_id=user_id, cursor=cursor, limit=limit, fields=fields, excerpt=excerpt)
         
         @app.post("/blogs/{blog_id}", response_model=CommonResponse)
-        async def get_blog_by_id(blog_id: int):
-            return self.get_blog_handler(blog_id=blog_id)
+        async def get_blog_by_id(blog_id: int, session: AsyncSession = Depends(self.manager.get_read_session)):
+            return await self.get_blog_handler(session=session, blog_id=blog_id)
         
         @app.post("/all_blogs/", response_model=CommonResponse)
-        async def get_blogs():
-            return self.get_blogs()
+        async def get_blogs(cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), fields: str = Query("full", pattern="^(full|summary)$"), excerpt: int = Query(0, ge=0, le=MAX_EXCERPT_LENGTH), session: AsyncSession = Depends(self.manager.get_read_session)):
+            return await self.get_blogs(session=session, cursor=cursor, limit=limit, fields=fields, excerpt=excerpt)
 
-    def create_blog(self, blog: BlogModel, access_token: str):
-        session = self.manager.Session()
+    async def create_blog(self, session, blog: BlogModel, access_token: str):
         try:
-            user = self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
+            user = await self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
             new_blog = Blog(
                 user_id=blog.user_id,
                 title=blog.title,
@@ -46,7 +56,7 @@ class BlogController(BaseController):
                 created_at=datetime.now()
             )
             session.add(new_blog)
-            session.commit()
+            await session.commit()
             
             return CommonResponse(
                 message="Blog created successfully",
@@ -59,27 +69,49 @@ class BlogController(BaseController):
                 )
             )
         except IntegrityError as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(400, detail="Database integrity error")
         except Exception as e:
-            session.rollback()
+            await session.rollback()
+            raise HTTPException(500, detail=str(e))
+
+    # One authentication and one multi-row INSERT ... RETURNING for the whole batch
+    async def create_blogs(self, session, blogs: BlogBulkModel, access_token: str):
+        user = await self.authenticate(user_id=blogs.user_id, access_token=access_token, session=session)
+        if not user:
+            self.raise_401()
+        try:
+            now = datetime.now()
+            result = await session.execute(
+                insert(Blog).returning(Blog.id, sort_by_parameter_order=True),
+                [{"user_id": blogs.user_id, "title": blog.title, "content": blog.content, "created_at": now} for blog in blogs.blogs]
+            )
+            ids = list(result.scalars().all())
+            await session.commit()
+            return CommonResponse(
+                message="Blogs created successfully",
+                data={"ids": ids, "count": len(ids)}
+            )
+        except IntegrityError as e:
+            await session.rollback()
+            raise HTTPException(400, detail="Database integrity error")
+        except Exception as e:
+            await session.rollback()
             raise HTTPException(500, detail=str(e))
-        finally:
-            session.close()
 
-    def edit_blog(self, blog: BlogResponse, access_token: str):
-        session = self.manager.Session()
+    async def edit_blog(self, session, blog: BlogResponse, access_token: str):
         try:
-            user = self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
+            user = await self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
             if not user:
                 self.raise_401()
-            existing_blog = session.query(Blog).filter(Blog.id == blog.id).first()
+            result = await session.execute(select(Blog).filter(Blog.id == blog.id))
+            existing_blog = result.scalars().first()
             if not existing_blog:
                 self.raise_404()
             existing_blog.title = blog.title
             existing_blog.content = blog.content
             existing_blog.created_at = datetime.now()
-            session.commit()
+            await session.commit()
             return CommonResponse(
                 message="Blog updated successfully",
                 data=BlogResponse(
@@ -91,96 +123,102 @@ class BlogController(BaseController):
                 )
             )
         except IntegrityError as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(400, detail="Database integrity error")
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(500, detail=str(e))
         finally:
-            print("Edit blog is executed.")
-            session.close()
+            logger.debug("Edit blog is executed.")
 
-    def delete_blog(self, blog: BlogResponse, access_token: str):
-        session = self.manager.Session()
+    async def delete_blog(self, session, blog: BlogResponse, access_token: str):
         try:
-            user = self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
+            user = await self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
             if not user:
                 self.raise_401()
-            existing_blog = session.query(Blog).filter(Blog.id == blog.id).first()
+            result = await session.execute(select(Blog).filter(Blog.id == blog.id))
+            existing_blog = result.scalars().first()
             if not existing_blog:
                 self.raise_404()
-            session.delete(existing_blog)  
-            session.commit()           
+            await session.delete(existing_blog)  
+            await session.commit()           
             return CommonResponse(
                 message="Blog deleted successfully",
                 data=blog
             )
         except IntegrityError as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(400, detail="Database integrity error")
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(500, detail=str(e))
         finally:
-            print("delete_blog is executed.")
-            session.close()
+            logger.debug("delete_blog is executed.")
     
-    def get_blogs(self):
-        session = self.manager.Session()
+    # Summary listings skip the content column and can return a short excerpt computed by the database
+    def listing_query(self, fields, excerpt):
+        if fields != "summary":
+            return select(Blog)
+        columns = [Blog.id, Blog.user_id, Blog.title, Blog.created_at]
+        if excerpt:
+            columns.append(func.substr(Blog.content, 1, excerpt).label("excerpt"))
+        return select(*columns)
+
+    def listing_item(self, blog, fields):
+        if fields == "summary":
+            return BlogSummaryResponse(
+                id=blog.id,
+                user_id=blog.user_id,
+                title=blog.title,
+                created_at=blog.created_at,
+                excerpt=getattr(blog, "excerpt", None)
+            )
+        return BlogResponse(
+            id=blog.id,
+            user_id=blog.user_id,
+            title=blog.title,
+            content=blog.content,
+            created_at=blog.created_at
+        )
+
+    async def get_blogs(self, session, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE, fields: str = "full", excerpt: int = 0):
+        after = decode_cursor(cursor, int) if cursor else None
         try:
-            blogs = session.query(Blog).order_by(Blog.created_at.desc()).all()
-            items = []
-            for blog in blogs:
-                items.append(
-                    BlogResponse(
-                        id=blog.id,
-                        user_id=blog.user_id,
-                        title=blog.title,
-                        content=blog.content,
-                        created_at=blog.created_at
-                    )
-                )
-            if not blogs:
+            result = await session.execute(keyset_page(self.listing_query(fields, excerpt), Blog, after, limit))
+            rows = result.all() if fields == "summary" else result.scalars().all()
+            blogs, next_cursor = split_page(rows, limit)
+            items = [self.listing_item(blog, fields) for blog in blogs]
+            if not blogs and after is None:
                 raise HTTPException(404, detail="Blog not found")
             return CommonResponse(
                 message="Blogs retrieved successfully",
-                data=items
+                data=items,
+                next_cursor=next_cursor
             )
         except Exception as e:
             raise HTTPException(500, detail=f"Server error: {str(e)}")
-        finally:
-            session.close()
 
-    def get_blogs_by_user(self, user_id: int):
-        session = self.manager.Session()
+    async def get_blogs_by_user(self, session, user_id: int, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE, fields: str = "full", excerpt: int = 0):
+        after = decode_cursor(cursor, int) if cursor else None
         try:
-            blogs = session.query(Blog).filter(Blog.user_id == user_id).order_by(Blog.created_at.desc()).all()
-            items = []
-            for blog in blogs:
-                items.append(
-                    BlogResponse(
-                        id=blog.id,
-                        user_id=blog.user_id,
-                        title=blog.title,
-                        content=blog.content,
-                        created_at=blog.created_at
-                    )
-                )
-            if not blogs:
+            result = await session.execute(keyset_page(self.listing_query(fields, excerpt).filter(Blog.user_id == user_id), Blog, after, limit))
+            rows = result.all() if fields == "summary" else result.scalars().all()
+            blogs, next_cursor = split_page(rows, limit)
+            items = [self.listing_item(blog, fields) for blog in blogs]
+            if not blogs and after is None:
                 raise HTTPException(404, detail="Blog not found")
             return CommonResponse(
                 message="Blogs retrieved successfully",
-                data=items
+                data=items,
+                next_cursor=next_cursor
             )
         except Exception as e:
             raise HTTPException(500, detail=f"Server error: {str(e)}")
-        finally:
-            session.close()
 
-    def get_blog_handler(self, blog_id: int):
-        session = self.manager.Session()
+    async def get_blog_handler(self, session, blog_id: int):
         try:
-            blog = session.query(Blog).filter(Blog.id == blog_id).first()
+            result = await session.execute(select(Blog).filter(Blog.id == blog_id))
+            blog = result.scalars().first()
             if not blog:
                 raise HTTPException(404, detail="Blog not found")
             return CommonResponse(
@@ -195,5 +233,3 @@ class BlogController(BaseController):
             )
         except Exception as e:
             raise HTTPException(500, detail=f"Server error: {str(e)}")
-        finally:
-            session.close()
\ No newline at end of file
@@ -1,10 +1,22 @@
+import logging
 from fastapi import HTTPException
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from controllers.BaseController import BaseController
-from models import BlogModel, BlogV2DeleteModel, BlogV2EditModel, BlogV2Response, CommonResponse
-from database import BlogV2, Blog
-from fastapi import Header, HTTPException
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_EXCERPT_LENGTH, decode_cursor, keyset_page, split_page
+from models import BlogModel, BlogV2BulkModel, BlogV2DeleteModel, BlogV2EditModel, BlogV2Response, BlogV2SummaryResponse, CommonResponse
+from database import BlogV2, Blog, MigrationCheckpoint
+from fastapi import Header, HTTPException, Depends, Query
+from typing import Optional
+from uuid import UUID, uuid4
+from utils.dialect_insert import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+BLOG_MIGRATION = "blogs_to_blogs_v2"
+MIGRATION_BATCH_SIZE = 1000
 
 class BlogV2Controller(BaseController):
 
@@ -13,83 +25,122 @@ class BlogV2Controller(BaseController):
 
         # Uncomment this code to migrate
         #@app.get("/blogs_v2/migrate/", response_model=CommonResponse)
-        #async def migrate_blog():
-        #    return self.migrate_blog()
+        #async def migrate_blog(batch_size: int = Query(MIGRATION_BATCH_SIZE, ge=1, le=10000), session: AsyncSession = Depends(self.manager.get_session)):
+        #    return await self.migrate_blog(session=session, batch_size=batch_size)
+        #
+        #@app.get("/blogs_v2/migrate/status/", response_model=CommonResponse)
+        #async def migrate_blog_status(session: AsyncSession = Depends(self.manager.get_session)):
+        #    return await self.migrate_blog_status(session=session)
         
         @app.post("/blogs/v2/", response_model=CommonResponse)
-        async def create_blog(blog: BlogModel, API_KEY: str = Header(...)):
-            return self.create_blog(blog=blog, access_token=API_KEY)
+        async def create_blog(blog: BlogModel, API_KEY: str = Header(...), session: AsyncSession = Depends(self.manager.get_session)):
+            return await self.create_blog(session=session, blog=blog, access_token=API_KEY)
         
+        @app.post("/blogs/v2/bulk/", response_model=CommonResponse)
+        async def upsert_blogs(blogs: BlogV2BulkModel, API_KEY: str = Header(...), session: AsyncSession = Depends(self.manager.get_session)):
+            return await self.upsert_blogs(session=session, blogs=blogs, access_token=API_KEY)
+
         @app.post("/blogs/v2/edit/", response_model=CommonResponse)
-        async def edit_blog(blog: BlogV2EditModel, API_KEY: str = Header(...)):
-            return self.edit_blog(blog=blog, access_token=API_KEY)
+        async def edit_blog(blog: BlogV2EditModel, API_KEY: str = Header(...), session: AsyncSession = Depends(self.manager.get_session)):
+            return await self.edit_blog(session=session, blog=blog, access_token=API_KEY)
         
         @app.post("/blogs/v2/delete/", response_model=CommonResponse)
-        async def delete_blog(blog: BlogV2DeleteModel, API_KEY: str = Header(...)):
-            return self.delete_blog(blog=blog, access_token=API_KEY)
+        async def delete_blog(blog: BlogV2DeleteModel, API_KEY: str = Header(...), session: AsyncSession = Depends(self.manager.get_session)):
+            return await self.delete_blog(session=session, blog=blog, access_token=API_KEY)
         
         @app.post("/all_blogs_v2/", response_model=CommonResponse)
-        async def get_blogs_by_user(user_id: int):
-            return self.get_blogs()
+        async def get_blogs(cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), fields: str = Query("full", pattern="^(full|summary)$"), excerpt: int = Query(0, ge=0, le=MAX_EXCERPT_LENGTH), session: AsyncSession = Depends(self.manager.get_read_session)):
+            return await self.get_blogs(session=session, cursor=cursor, limit=limit, fields=fields, excerpt=excerpt)
         
         @app.post("/blogs/v2/user/{user_id}", response_model=CommonResponse)
-        async def get_blogs_by_user(user_id: int):
-            return self.get_blogs_by_user(user_id=user_id)
+        async def get_blogs_by_user(user_id: int, cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), fields: str = Query("full", pattern="^(full|summary)$"), excerpt: int = Query(0, ge=0, le=MAX_EXCERPT_LENGTH), session: AsyncSession = Depends(self.manager.get_read_session)):
+            return await self.get_blogs_by_user(session=session, user_id=user_id, cursor=cursor, limit=limit, fields=fields, excerpt=excerpt)
         
         @app.post("/blogs/v2/{blog_id}", response_model=CommonResponse)
-        async def get_blog_by_id(blog_id: int):
-            return self.get_blog_handler(blog_id=blog_id)
+        async def get_blog_by_id(blog_id: UUID, session: AsyncSession = Depends(self.manager.get_read_session)):
+            return await self.get_blog_handler(session=session, blog_id=blog_id)
         
-    def migrate_blog(self):
-        session = self.manager.Session()
+    # Copies blogs into blogs_v2 in keyset batches, committing each batch together with its
+    # checkpoint so an interrupted run resumes after the last copied id. Each batch holds the
+    # checkpoint row locked, so overlapping runs take turns instead of copying the same batch.
+    async def migrate_blog(self, session, batch_size: int = MIGRATION_BATCH_SIZE):
         try:
-            # Step 1: Query all blogs from the Blog table
-            blogs = session.query(Blog).all()
-            
-            # Step 2: Create BlogV2 instances and add them to the session
-            for blog in blogs:
-                new_blog_v2 = BlogV2(
-                    user_id=blog.user_id,
-                    title=blog.title,
-                    content=blog.content,
-                    created_at=blog.created_at
-                )
-                session.add(new_blog_v2)
-
-            # Step 3: Commit the session to save changes to the database
-            session.commit()
-
-            blogs_v2 = session.query(BlogV2).all()
-             # Step 2: Create BlogV2 instances and add them to the session
-            responses = []
-            for blog in blogs_v2:
-                new_blog_v2 = BlogV2Response(
-                    id=blog.id, 
-                    user_id=blog.user_id, 
-                    title=blog.title, 
-                    content=blog.content, 
-                    created_at=blog.created_at
+            await session.execute(
+                dialect_insert(session, MigrationCheckpoint)
+                .values(name=BLOG_MIGRATION, last_id=0, migrated=0, done=False)
+                .on_conflict_do_nothing(index_elements=[MigrationCheckpoint.name])
+            )
+            await session.commit()
+            batches = 0
+            while True:
+                checkpoint = await self.lock_checkpoint(session)
+                result = await session.execute(
+                    select(Blog.id, Blog.user_id, Blog.title, Blog.content, Blog.created_at)
+                    .where(Blog.id > checkpoint.last_id)
+                    .order_by(Blog.id)
+                    .limit(batch_size)
                 )
-                responses.append(new_blog_v2)
-            
+                rows = result.all()
+                if not rows:
+                    checkpoint.done = True
+                    checkpoint.updated_at = datetime.now()
+                    await session.commit()
+                    break
+                await session.execute(insert(BlogV2), [
+                    {"user_id": row.user_id, "title": row.title, "content": row.content, "created_at": row.created_at}
+                    for row in rows
+                ])
+                checkpoint.last_id = rows[-1].id
+                checkpoint.migrated += len(rows)
+                checkpoint.done = False
+                checkpoint.updated_at = datetime.now()
+                await session.commit()
+                batches += 1
+                logger.info("Migrated %d blogs (last id %s)", checkpoint.migrated, checkpoint.last_id)
             return CommonResponse(
-                message="Blog created successfully",
-                data=responses
+                message="Migrate successfully",
+                data=self.migration_progress(checkpoint, batches)
             )
         except IntegrityError as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(400, detail="Database integrity error")
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(500, detail=str(e))
-        finally:
-            session.close()
-        return CommonResponse(message='Migrate successfully', data={})
 
-    def create_blog(self, blog: BlogModel, access_token: str):
-        session = self.manager.Session()
+    async def lock_checkpoint(self, session):
+        # Re-read on every batch: another run may have moved last_id while this one waited for the lock
+        result = await session.execute(
+            select(MigrationCheckpoint)
+            .where(MigrationCheckpoint.name == BLOG_MIGRATION)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one()
+
+    async def migrate_blog_status(self, session):
+        checkpoint = await session.get(MigrationCheckpoint, BLOG_MIGRATION)
+        if checkpoint is None:
+            return CommonResponse(message="Migration has not started", data=None)
+        remaining = await session.scalar(select(func.count()).select_from(Blog).where(Blog.id > checkpoint.last_id))
+        data = self.migration_progress(checkpoint)
+        data["remaining"] = remaining
+        return CommonResponse(message="", data=data)
+
+    def migration_progress(self, checkpoint, batches=None):
+        progress = {
+            "migrated": checkpoint.migrated,
+            "last_id": checkpoint.last_id,
+            "done": checkpoint.done,
+            "updated_at": checkpoint.updated_at,
+        }
+        if batches is not None:
+            progress["batches"] = batches
+        return progress
+
+    async def create_blog(self, session, blog: BlogModel, access_token: str):
         try:
-            user = self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
+            user = await self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
             if not user:
                 self.raise_401()
             new_blog = BlogV2(
@@ -99,7 +150,7 @@ class BlogV2Controller(BaseController):
                 created_at=datetime.now()
             )
             session.add(new_blog)
-            session.commit()
+            await session.commit()
             
             return CommonResponse(
                 message="Blog created successfully",
@@ -112,32 +163,62 @@ class BlogV2Controller(BaseController):
                 )
             )
         except IntegrityError as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(400, detail="Database integrity error")
         except Exception as e:
-            session.rollback()
+            await session.rollback()
+            raise HTTPException(500, detail=str(e))
+
+    # Creates posts without an id and updates the caller's posts that have one, in a single
+    # INSERT ... ON CONFLICT ... RETURNING. Ids are generated here so new rows need no refetch.
+    async def upsert_blogs(self, session, blogs: BlogV2BulkModel, access_token: str):
+        user = await self.authenticate(user_id=blogs.user_id, access_token=access_token, session=session)
+        if not user:
+            self.raise_401()
+        # Postgres refuses to update the same row twice in one ON CONFLICT statement
+        ids = [blog.id for blog in blogs.blogs if blog.id is not None]
+        if len(ids) != len(set(ids)):
+            raise HTTPException(400, detail="Each id can appear only once per request")
+        try:
+            now = datetime.now()
+            rows = [
+                {"id": blog.id or uuid4(), "user_id": blogs.user_id, "title": blog.title, "content": blog.content, "created_at": now}
+                for blog in blogs.blogs
+            ]
+            statement = dialect_insert(session, BlogV2)
+            statement = statement.on_conflict_do_update(
+                index_elements=[BlogV2.id],
+                set_={"title": statement.excluded.title, "content": statement.excluded.content, "created_at": statement.excluded.created_at},
+                # Never overwrite another user's post
+                where=BlogV2.user_id == statement.excluded.user_id
+            ).returning(BlogV2.id)
+            result = await session.execute(statement, rows)
+            ids = list(result.scalars().all())
+            await session.commit()
+            return CommonResponse(
+                message="Blogs saved successfully",
+                data={"ids": ids, "count": len(ids), "skipped": len(rows) - len(ids)}
+            )
+        except IntegrityError as e:
+            await session.rollback()
+            raise HTTPException(400, detail="Database integrity error")
+        except Exception as e:
+            await session.rollback()
             raise HTTPException(500, detail=str(e))
-        finally:
-            session.close()
 
-    def edit_blog(self, blog: BlogV2Response, access_token: str):
-        session = self.manager.Session()
+    async def edit_blog(self, session, blog: BlogV2Response, access_token: str):
         try:
-            print(1)
-            user = self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
+            user = await self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
             if not user:
                 self.raise_401()
-            print(2)
-            existing_blog = session.query(BlogV2).filter(BlogV2.id == blog.id).first()
+            result = await session.execute(select(BlogV2).filter(BlogV2.id == blog.id))
+            existing_blog = result.scalars().first()
             if not existing_blog:
                 self.raise_404()
-            print(3)
             existing_blog.title = blog.title
             existing_blog.content = blog.content
             existing_blog.created_at = datetime.now()
-            print(4)
-            session.commit()
-            print(5)
+            await session.commit()
             return CommonResponse(
                 message="Blog updated successfully",
                 data=BlogV2Response(
@@ -149,95 +230,101 @@ class BlogV2Controller(BaseController):
                 )
             )
         except IntegrityError as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(400, detail="Database integrity error")
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(500, detail=str(e))
         finally:
-            print("Edit blog is executed.")
-            session.close()
+            logger.debug("Edit blog is executed.")
 
-    def delete_blog(self, blog: BlogV2Response, access_token: str):
-        session = self.manager.Session()
+    async def delete_blog(self, session, blog: BlogV2Response, access_token: str):
         try:
-            user = self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
+            user = await self.authenticate(user_id=blog.user_id, access_token=access_token, session=session)
             if not user:
                 self.raise_401()
-            existing_blog = session.query(BlogV2).filter(BlogV2.id == blog.id).first()
+            result = await session.execute(select(BlogV2).filter(BlogV2.id == blog.id))
+            existing_blog = result.scalars().first()
             if not existing_blog:
                 self.raise_404()
-            session.delete(existing_blog)  
-            session.commit()           
+            await session.delete(existing_blog)  
+            await session.commit()           
             return CommonResponse(
                 message="Blog deleted successfully",
                 data=blog
             )
         except IntegrityError as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(400, detail="Database integrity error")
         except Exception as e:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(500, detail=str(e))
         finally:
-            print("delete_blog is executed.")
-            session.close()
+            logger.debug("delete_blog is executed.")
+
+    # Summary listings skip the content column and can return a short excerpt computed by the database
+    def listing_query(self, fields, excerpt):
+        if fields != "summary":
+            return select(BlogV2)
+        columns = [BlogV2.id, BlogV2.user_id, BlogV2.title, BlogV2.created_at]
+        if excerpt:
+            columns.append(func.substr(BlogV2.content, 1, excerpt).label("excerpt"))
+        return select(*columns)
 
-    def get_blogs(self):
-        session = self.manager.Session()
+    def listing_item(self, blog, fields):
+        if fields == "summary":
+            return BlogV2SummaryResponse(
+                id=blog.id,
+                user_id=blog.user_id,
+                title=blog.title,
+                created_at=blog.created_at,
+                excerpt=getattr(blog, "excerpt", None)
+            )
+        return BlogV2Response(
+            id=blog.id,
+            user_id=blog.user_id,
+            title=blog.title,
+            content=blog.content,
+            created_at=blog.created_at
+        )
+
+    async def get_blogs(self, session, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE, fields: str = "full", excerpt: int = 0):
+        after = decode_cursor(cursor, UUID) if cursor else None
         try:
-            blogs = session.query(Blog).order_by(Blog.created_at.desc()).all()
-            items = []
-            for blog in blogs:
-                items.append(
-                    BlogV2Response(
-                        id=blog.id,
-                        user_id=blog.user_id,
-                        title=blog.title,
-                        content=blog.content,
-                        created_at=blog.created_at
-                    )
-                )
-            if not blogs:
+            result = await session.execute(keyset_page(self.listing_query(fields, excerpt), BlogV2, after, limit))
+            rows = result.all() if fields == "summary" else result.scalars().all()
+            blogs, next_cursor = split_page(rows, limit)
+            items = [self.listing_item(blog, fields) for blog in blogs]
+            if not blogs and after is None:
                 raise HTTPException(404, detail="Blog not found")
             return CommonResponse(
                 message="Blogs retrieved successfully",
-                data=items
+                data=items,
+                next_cursor=next_cursor
             )
         except Exception as e:
             raise HTTPException(500, detail=f"Server error: {str(e)}")
-        finally:
-            session.close()
 
-    def get_blogs_by_user(self, user_id: int):
-        session = self.manager.Session()
+    async def get_blogs_by_user(self, session, user_id: int, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE, fields: str = "full", excerpt: int = 0):
+        after = decode_cursor(cursor, UUID) if cursor else None
         try:
-            blogs = session.query(BlogV2).filter(BlogV2.user_id == user_id).order_by(BlogV2.created_at.desc()).all()
-            items = []
-            for blog in blogs:
-                items.append(
-                    BlogV2Response(
-                        id=blog.id,
-                        user_id=blog.user_id,
-                        title=blog.title,
-                        content=blog.content,
-                        created_at=blog.created_at
-                    )
-                )
-            if not blogs:
+            result = await session.execute(keyset_page(self.listing_query(fields, excerpt).filter(BlogV2.user_id == user_id), BlogV2, after, limit))
+            rows = result.all() if fields == "summary" else result.scalars().all()
+            blogs, next_cursor = split_page(rows, limit)
+            items = [self.listing_item(blog, fields) for blog in blogs]
+            if not blogs and after is None:
                 raise HTTPException(404, detail="Blog not found")
             return CommonResponse(
                 message="Blogs retrieved successfully",
-                data=items
+                data=items,
+                next_cursor=next_cursor
             )
         except Exception as e:
             raise HTTPException(500, detail=f"Server error: {str(e)}")
-        finally:
-            session.close()
-    def get_blog_handler(self, blog_id: int):
-        session = self.manager.Session()
+    async def get_blog_handler(self, session, blog_id: UUID):
         try:
-            blog = session.query(BlogV2).filter(BlogV2.id == blog_id).first()
+            result = await session.execute(select(BlogV2).filter(BlogV2.id == blog_id))
+            blog = result.scalars().first()
             if not blog:
                 raise HTTPException(404, detail="Blog not found")
             return CommonResponse(
@@ -252,5 +339,3 @@ class BlogV2Controller(BaseController):
             )
         except Exception as e:
             raise HTTPException(500, detail=f"Server error: {str(e)}")
-        finally:
-            session.close()
\ No newline at end of file
@@ -1,30 +1,56 @@
+import logging
 from controllers.BaseController import BaseController
 from utils.google_llm_provider import GeminiProvider
 from models import Conversation, CommonResponse
 from fastapi import HTTPException, Header
 import httpx
+import os
+import time
+from fastapi.responses import StreamingResponse
+from functools import partial
+from utils.completion_cache import completion_cache, completion_key, record_stream, replay
+from utils.llm_provider import SSEResponse, llm_latency
 from utils.llm_providers import GPT4OMiniProvider, NVDIADeepSeekR1Provider, GPT4OMiniLangchainProvider, GPT4OMiniFunctionCallingProvider, DeepSeekR1Provider
+from utils.provider_registry import ProviderRegistry
+from utils.semantic_cache import semantic_cache
+
+logger = logging.getLogger(__name__)
 
 def chat_providers(controller):
-    return [
-        GPT4OMiniProvider(controller),
-        NVDIADeepSeekR1Provider(controller),
-        GPT4OMiniFunctionCallingProvider(controller),
-        GPT4OMiniLangchainProvider(controller),
-        DeepSeekR1Provider(controller),
-        GeminiProvider(controller)
-    ]
+    registry = ProviderRegistry(controller)
+    registry.register(GPT4OMiniProvider)
+    registry.register(NVDIADeepSeekR1Provider)
+    registry.register(GPT4OMiniFunctionCallingProvider)
+    registry.register(GPT4OMiniLangchainProvider)
+    registry.register(DeepSeekR1Provider, aliases=("deepseek-r1",))
+    registry.register(GeminiProvider)
+    registry.set_default(os.environ.get("CHAT_DEFAULT_MODEL", "gpt-4o-mini"))
+    # Extra names for existing models, e.g. CHAT_MODEL_ALIASES=gpt-4o=gpt-4o-mini,gemini=gemini-2.0-flash
+    for item in filter(None, os.environ.get("CHAT_MODEL_ALIASES", "").split(",")):
+        name, _, model = item.partition("=")
+        registry.alias(name.strip(), model.strip())
+    return registry
+
+def cached_response(value):
+    if value["kind"] == "sse":
+        return SSEResponse(replay(value["events"]))
+    return CommonResponse(**value["body"])
 
 class ChatController(BaseController):
+    completion_cache = completion_cache
+    semantic_cache = semantic_cache
 
     def setup(self):
         app = self.app
         timeout = httpx.Timeout(120.0)  # 120 seconds
-        self.client = httpx.AsyncClient(timeout=timeout)
+        # Every provider's SDK client sends through this pool, so size it for concurrent completions
+        limits = httpx.Limits(
+            max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", "500")),
+            max_keepalive_connections=int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "100"))
+        )
+        self.client = httpx.AsyncClient(timeout=timeout, limits=limits)
         self.providers = chat_providers(self)
-        self.chat_models = []
-        for provider in self.providers:
-            self.chat_models.append(provider.get_model())
+        self.chat_models = self.providers.models
 
         @app.post("/chat-models/")
         def chat_models():
@@ -34,24 +60,54 @@ class ChatController(BaseController):
         async def chat(conversation: Conversation, API_KEY: str = Header(...)):
             if not conversation:
                 raise HTTPException(status_code=400, detail="Message content cannot be empty")
-            session = self.manager.Session()
             try:
-                user = self.authenticate_with_api_key(access_token=API_KEY, session=session)
+                user = await self.authenticate_with_api_key(access_token=API_KEY)
                 if not user:
                     self.raise_401()
-                selected_provider = None
-                for provider in self.providers:
-                    if provider.get_model().model == conversation.model:
-                        selected_provider = provider
-                        break
-                if selected_provider:
-                    return await selected_provider.execute(conversation)
-                else:
-                    return await self.providers[0].execute(conversation)
+                model, provider = self.providers.resolve(conversation.model)
+                return await self.execute_cached(model, provider, conversation)
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"{e}")
             
         @app.on_event("shutdown")
         async def shutdown_event():
-            print("Shutting down")
-            await self.client.aclose()
\ No newline at end of file
+            logger.info("Shutting down chat client")
+            await self.client.aclose()
+            self.completion_cache.close()
+
+    async def execute_cached(self, model, provider, conversation):
+        # Exact matches first, then paraphrases of the final question; a miss is stored in every tier that was asked
+        stores = []
+        if self.completion_cache.enabled_for(model):
+            key = completion_key(model, conversation.messages, conversation.stream, provider.tool_names, provider.sampling_params)
+            cached = await self.completion_cache.get(model, key)
+            if cached is not None:
+                return cached_response(cached)
+            stores.append(partial(self.completion_cache.put, key))
+        if self.semantic_cache.enabled_for(model):
+            cached, query = await self.semantic_cache.lookup(model, conversation.messages, conversation.stream, provider.tool_names, provider.sampling_params)
+            if cached is not None:
+                return cached_response(cached)
+            if query is not None:
+                stores.append(partial(self.semantic_cache.put, query))
+        response = await self.execute_timed(model, provider, conversation)
+        if not stores:
+            return response
+        if isinstance(response, StreamingResponse):
+            # Stored only once the client has received the whole stream
+            response.body_iterator = record_stream(response.body_iterator, stores)
+        elif response.data:
+            # Providers report some failures as an empty reply rather than an exception
+            value = {"kind": "json", "body": response.model_dump(mode="json")}
+            for store in stores:
+                await store(value)
+        return response
+
+    async def execute_timed(self, model, provider, conversation):
+        start, outcome = time.perf_counter(), "error"
+        try:
+            response = await provider.execute(conversation)
+            outcome = "ok"
+            return response
+        finally:
+            llm_latency.labels(model=model, outcome=outcome).observe(time.perf_counter() - start)
@@ -0,0 +1,11 @@
+from controllers.BaseController import BaseController
+from models import CommonResponse
+
+class DatabaseController(BaseController):
+
+    def setup(self):
+        app = self.app
+
+        @app.get("/db/pool-stats/", response_model=CommonResponse)
+        async def pool_stats():
+            return CommonResponse(message="", data=self.manager.pool_stats())
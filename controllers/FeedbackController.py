@@ -1,25 +1,31 @@
+import logging
 from controllers.BaseController import BaseController
 from models import CommonResponse, FeedBackModel, FeedBackResponse
 from database import Feedback
-from fastapi import HTTPException
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, keyset_page, split_page
+from fastapi import HTTPException, Depends, Query
+from typing import Optional
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
 
 class FeedbackController(BaseController):
 
     def setup(self):
         app = self.app
         @app.post("/feedback/")
-        def feeedback(feedback: FeedBackModel):
-            return self.createFeedBack(feedback=feedback)
+        async def feeedback(feedback: FeedBackModel, session: AsyncSession = Depends(self.manager.get_session)):
+            return await self.createFeedBack(session=session, feedback=feedback)
         
         @app.post("/feedback/user/{user_id}")  # New endpoint for querying by user_id
-        def get_feedback_by_user(user_id: int):
-            return self.get_feedback_by_user_handler(user_id=user_id) # New handler
+        async def get_feedback_by_user(user_id: int, cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), session: AsyncSession = Depends(self.manager.get_read_session)):
+            return await self.get_feedback_by_user_handler(session=session, user_id=user_id, cursor=cursor, limit=limit) # New handler
 
             
-    def createFeedBack(self, feedback):
-        session = self.manager.Session()
+    async def createFeedBack(self, session, feedback):
         feedback = Feedback(
             user_id=feedback.user_id, 
             contact=feedback.contact, 
@@ -29,20 +35,18 @@ class FeedbackController(BaseController):
         )
         try:
             session.add(feedback)
-            session.commit()
+            await session.commit()
             response = FeedBackResponse(id=feedback.id, contact=feedback.contact, title=feedback.title, content=feedback.content, created_at=feedback.created_at)
             return CommonResponse(message="Successfully Submit feedback", data=response)
         except IntegrityError:
-            session.rollback()
+            await session.rollback()
             raise HTTPException(status_code=400, detail="")
-        finally:
-            session.close()
 
-    def get_feedback_by_user_handler(self, user_id: int):
-        session = self.manager.Session()
-        print("Feedbacks")
+    async def get_feedback_by_user_handler(self, session, user_id: int, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+        after = decode_cursor(cursor) if cursor else None
         try:
-            feedbacks = session.query(Feedback).filter(Feedback.user_id == user_id).all()
+            result = await session.execute(keyset_page(select(Feedback).filter(Feedback.user_id == user_id), Feedback, after, limit))
+            feedbacks, next_cursor = split_page(result.scalars().all(), limit)
             feedback_responses = []
             for feedback in feedbacks:
                 feedback_responses.append(FeedBackResponse(
@@ -52,10 +56,8 @@ class FeedbackController(BaseController):
                     content=feedback.content,
                     created_at=feedback.created_at
                 ))
-            print(f"Feedbacks count: {len(feedback_responses)}")
-            return CommonResponse(message="Successfully retrieved feedbacks", data=feedback_responses)
+            logger.debug("Feedbacks count: %d", len(feedback_responses))
+            return CommonResponse(message="Successfully retrieved feedbacks", data=feedback_responses, next_cursor=next_cursor)
         except Exception as e: # Catching general exceptions for now
-            print(f"Length: {len(feedback_responses)}")
+            logger.exception("Retrieving feedbacks failed for user %s", user_id)
             raise HTTPException(status_code=500, detail=f"Error retrieving feedbacks: {e}") # More informative error
-        finally:
-            session.close()
\ No newline at end of file
@@ -0,0 +1,29 @@
+from controllers.BaseController import BaseController
+from fastapi.responses import PlainTextResponse
+from utils.metrics import registry
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class MetricsController(BaseController):
+
+    def setup(self):
+        app = self.app
+        registry.register_collector(self.collect_pools)
+        registry.register_collector(self.collect_token_cache)
+
+        @app.get("/metrics", include_in_schema=False)
+        async def metrics():
+            return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+    def collect_pools(self):
+        stats = self.manager.pool_stats()
+        pools = [stats] + stats["replicas"]
+        for key in ("size", "checked_in", "checked_out", "overflow"):
+            yield f"db_pool_{key}", "gauge", f"Connection pool {key.replace('_', ' ')}.", [({"pool": pool["name"]}, pool[key]) for pool in pools]
+        yield "db_replica_healthy", "gauge", "1 if the replica passed its last health check.", [({"pool": pool["name"]}, int(pool["healthy"])) for pool in stats["replicas"]]
+        yield "db_sessions_leaked_total", "counter", "Sessions garbage collected without being closed.", [({}, stats["sessions"]["leaked"])]
+
+    def collect_token_cache(self):
+        stats = self.token_cache.stats()
+        yield "token_cache_size", "gauge", "Access tokens held in the process token cache.", [({}, stats["size"])]
+        yield "token_cache_lookups_total", "counter", "Token cache lookups by result.", [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]
@@ -1,23 +1,13 @@
 
+import logging
 from controllers.BaseController import BaseController
 from fastapi import  WebSocket, WebSocketDisconnect, Query
 import json
-import os 
-import openai
 from database import User
 from models import WebSocketMessage
+from utils.openai_clients import get_gpt4omini_client
 
-gpt4o_api_version = "2024-05-01-preview"
-
-def get_gpt4omini_client():
-    api_key = os.environ["AZURE_OPENAI_API_KEY"]
-    
-    client = openai.AzureOpenAI(
-        azure_endpoint="https://ai-lonnieqin6583ai982841037486.openai.azure.com/",
-        api_key=api_key,
-        api_version=gpt4o_api_version
-    )
-    return client
+logger = logging.getLogger(__name__)
 
 class ConnectionManager:
     def __init__(self):
@@ -46,6 +36,11 @@ class OllamaWebSocketController(BaseController):
         self.connection_manager = ConnectionManager()
         self.gpt_4o = get_gpt4omini_client()
         app = self.app
+
+        @app.on_event("shutdown")
+        async def close_gpt_4o():
+            await self.gpt_4o.close()
+
         @app.websocket("/ollama")
         def websocket(
             websocket: WebSocket,
@@ -64,8 +59,10 @@ class OllamaWebSocketController(BaseController):
         user_id: str = Query(..., description="User ID to identify connection"),
         access_token: str = Query(..., description="Access token")
     ):
-        user = self.authenticate(user_id=user_id, access_token=access_token)
-        print(f"User: {user}")
+        user = None
+        if user_id.isdigit():
+            user = await self.authenticate(user_id=int(user_id), access_token=access_token)
+        logger.debug("WebSocket user %s", user.user_id if user else None)
         if user == None:
             await websocket.send_text("Invalid JSON format")
             await websocket.close()
@@ -0,0 +1,59 @@
+from controllers.BaseController import BaseController
+from fastapi import HTTPException, Header, Query
+from fastapi.responses import PlainTextResponse
+from models import CommonResponse
+from utils.profiler import SamplingProfiler, AllocationTracker
+import asyncio
+import hmac
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MAX_PROFILE_SECONDS = 60
+
+class ProfilerController(BaseController):
+
+    # The endpoint is disabled unless ADMIN_API_KEY is set
+    admin_api_key = os.environ.get("ADMIN_API_KEY")
+
+    def setup(self):
+        app = self.app
+        # One profile at a time: overlapping samplers would skew each other
+        self.lock = asyncio.Lock()
+
+        @app.post("/admin/profile/", include_in_schema=False)
+        async def profile(
+            seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+            interval_ms: float = Query(5, ge=1, le=100),
+            allocations: bool = False,
+            format: str = Query("json", pattern="^(json|collapsed)$"),
+            ADMIN_API_KEY: str = Header(...)
+        ):
+            self.authenticate_admin(ADMIN_API_KEY)
+            return await self.profile(seconds, interval_ms / 1000, allocations, format)
+
+    def authenticate_admin(self, api_key):
+        if not self.admin_api_key or not hmac.compare_digest(api_key.encode(), self.admin_api_key.encode()):
+            self.raise_401()
+
+    async def profile(self, seconds, interval, allocations, format):
+        if self.lock.locked():
+            raise HTTPException(409, detail="A profile is already running.")
+        async with self.lock:
+            logger.info("Profiling for %.1f s (allocations=%s)", seconds, allocations)
+            tracker = AllocationTracker() if allocations else None
+            # Snapshots and their comparison walk every traced allocation, so they run off the loop
+            # like the sampler, which sleeps between samples in its own thread
+            if tracker:
+                await asyncio.to_thread(tracker.start)
+            profiler = await asyncio.to_thread(SamplingProfiler(interval).run, seconds)
+            top_allocations = await asyncio.to_thread(tracker.stop) if tracker else None
+        if format == "collapsed":
+            return PlainTextResponse(profiler.collapsed(), headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'})
+        return CommonResponse(message="", data={
+            "seconds": seconds,
+            "samples": profiler.samples,
+            "collapsed": profiler.collapsed(),
+            "allocations": top_allocations,
+        })
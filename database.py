@@ -1,10 +1,21 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, ForeignKey, TIMESTAMP, func
+import logging
+from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, ForeignKey, TIMESTAMP, Index, func
 from sqlalchemy.ext.declarative import declarative_base
 from dotenv import load_dotenv
 from sqlalchemy.dialects.postgresql import UUID
 from uuid import uuid4
 import os
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool
+from utils.pool_metrics import PoolMetrics, instrumented_pool_class, instrument_queries, pool_stats
+from utils.replica_router import Replica, ReplicaRouter
+from contextlib import asynccontextmanager
+import migrations
+import weakref
+
+logger = logging.getLogger(__name__)
+# Schema changes to these models ship as a new module in migrations/versions
 Base = declarative_base()
 # Define a sample table model
 class User(Base):
@@ -16,6 +27,10 @@ class User(Base):
     access_token = Column(String, unique=False, nullable=False)
     token_expire_date =Column(TIMESTAMP, default=func.now()) 
     created_at = Column(TIMESTAMP, default=func.now())
+    __table_args__ = (
+        Index("ix_chat_users_email", "email", unique=True),
+        Index("ix_chat_users_access_token", "access_token", unique=True),
+    )
 
 class Conversation(Base):
     __tablename__ = "conversations"
@@ -31,6 +46,9 @@ class Message(Base):
     message_text = Column(Text, nullable=False)
     is_bot_message = Column(Boolean, default=False)
     sent_at = Column(TIMESTAMP, default=func.now())
+    __table_args__ = (
+        Index("ix_messages_conversation_id_sent_at", "conversation_id", "sent_at"),
+    )
 
 class Preference(Base):
     __tablename__ = "preferences"
@@ -47,6 +65,9 @@ class Feedback(Base):
     title = Column(String, default="")
     content = Column(String, default="")
     created_at = Column(TIMESTAMP, default=func.now())
+    __table_args__ = (
+        Index("ix_user_feedbacks_user_id_created_at", "user_id", "created_at"),
+    )
 
 class Blog(Base):
     __tablename__ = "blogs"
@@ -55,6 +76,10 @@ class Blog(Base):
     title = Column(String(255))  # Reasonable title length
     content = Column(Text)       # Supports large text (up to 1M+ chars)
     created_at = Column(TIMESTAMP, default=func.now())
+    __table_args__ = (
+        Index("ix_blogs_user_id_created_at", "user_id", "created_at"),
+        Index("ix_blogs_created_at_id", "created_at", "id"),
+    )
 
 class BlogV2(Base):
     __tablename__ = "blogs_v2"
@@ -63,47 +88,179 @@ class BlogV2(Base):
     title = Column(String(255))  # Reasonable title length
     content = Column(Text)       # Supports large text (up to 1M+ chars)
     created_at = Column(TIMESTAMP, default=func.now())
+    __table_args__ = (
+        Index("ix_blogs_v2_user_id_created_at", "user_id", "created_at"),
+        Index("ix_blogs_v2_created_at_id", "created_at", "id"),
+    )
+
+# Progress of resumable data migrations such as blogs -> blogs_v2
+class MigrationCheckpoint(Base):
+    __tablename__ = "migration_checkpoints"
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    migrated = Column(Integer, nullable=False, default=0)
+    done = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(TIMESTAMP, default=func.now())
 
 # Assuming the User model is defined as shown in your initial code
 class DatabaseManager:
 
     _instance = None
 
-    def __new__(cls, db_url):
+    def __new__(cls, db_url, replica_urls=None):
         if cls._instance is None:
             cls._instance = super(DatabaseManager, cls).__new__(cls)
-            cls._instance.__init__(db_url)
         return cls._instance
     
-    def __init__(self, db_url):
-        self.engine = create_engine(db_url)
-        self.connect_and_create_table(db_url=db_url)
-        self.Session = sessionmaker(bind=self.engine)
-        print("Init DatabaseManager")
-
-    # Function to connect to the remote PostgreSQL database and create tables
-    def connect_and_create_table(self, db_url):
-        try:
-            # Create an engine to connect to the database
-            engine = create_engine(db_url)
+    def __init__(self, db_url, replica_urls=None):
+        # __new__ hands back the singleton, so skip building a second set of engines
+        if getattr(self, "_initialized", False):
+            return
+        self._initialized = True
+        # The sync engine only runs boot-time schema checks, so it doesn't keep a pool of its own
+        self.engine = create_engine(db_url, poolclass=NullPool)
+        self.check_schema()
+        # Async engine used by the request handlers so database waits don't block the event loop
+        self.pool_metrics = PoolMetrics("primary")
+        self.async_engine = create_pooled_engine(db_url, self.pool_metrics)
+        self.AsyncSession = async_sessionmaker(bind=self.async_engine, class_=AsyncSession, expire_on_commit=False)
+        # Read-only traffic that can tolerate replication lag goes to the replicas
+        replicas = []
+        for index, replica_url in enumerate(replica_urls or []):
+            metrics = PoolMetrics(f"replica-{index}")
+            engine = create_pooled_engine(replica_url, metrics)
+            replicas.append(Replica(metrics.name, engine, async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False), metrics))
+        self.replica_router = ReplicaRouter(
+            replicas,
+            check_interval=float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", "5")),
+            max_lag=float(os.environ.get("DB_REPLICA_MAX_LAG", "5")),
+        )
+        self.session_counters = SessionCounters()
+        logger.info("Init DatabaseManager")
 
-            # Create a configured "Session" class
-            Session = sessionmaker(bind=engine)
+    # FastAPI dependency: one session per request, shared by every dependency that asks for it
+    async def get_session(self):
+        async with self.session_scope() as session:
+            yield session
 
-            # Create a Session instance
-            session = Session()
+    # FastAPI dependency for lag-tolerant reads: a replica session, or the primary if none is usable.
+    # Writes and lookups that must see the request's own writes (e.g. access tokens) use get_session.
+    async def get_read_session(self):
+        replica = await self.replica_router.pick()
+        async with self.session_scope(replica.Session if replica else None) as session:
+            yield session
 
-            # Create all tables defined in the Base
-            Base.metadata.create_all(engine)
+    @asynccontextmanager
+    async def session_scope(self, sessionmaker=None):
+        session = (sessionmaker or self.AsyncSession)()
+        state = self.session_counters.opened(session)
+        try:
+            yield session
+        finally:
+            await session.close()
+            self.session_counters.closed(state)
 
-            print("Table(s) created successfully!")
+    async def dispose(self):
+        await self.async_engine.dispose()
+        for replica in self.replica_router.replicas:
+            await replica.engine.dispose()
+        self.engine.dispose()
 
-            # Close the session
-            session.close()
+    def pool_stats(self):
+        stats = pool_stats(self.async_engine, self.pool_metrics)
+        stats["sessions"] = self.session_counters.stats()
+        stats["replicas"] = []
+        for replica, health in zip(self.replica_router.replicas, self.replica_router.stats()):
+            health.update(pool_stats(replica.engine, replica.metrics))
+            stats["replicas"].append(health)
+        return stats
 
+    # Startup only reads the schema_version row; migrations normally run from `python -m migrations upgrade`
+    def check_schema(self):
+        try:
+            with self.engine.connect() as connection:
+                current = migrations.current_revision(connection)
         except Exception as e:
-            print(f"An error occurred: {e}")
+            logger.exception("Schema check failed: %s", e)
+            return
+        head = migrations.head_revision()
+        if current >= head:
+            return
+        if os.environ.get("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes"):
+            # Not caught: serving on a partly migrated schema fails requests later in less obvious ways
+            migrations.upgrade(self.engine)
+        else:
+            logger.warning("Database schema is at revision %s, expected %s. Run `python -m migrations upgrade`.", current, head)
+
+class SessionCounters:
+    """Counts sessions opened through DatabaseManager and flags ones that were never closed."""
+
+    def __init__(self):
+        self.opened_total = 0
+        self.closed_total = 0
+        self.leaked_total = 0
+
+    def opened(self, session):
+        self.opened_total += 1
+        state = {"closed": False}
+        weakref.finalize(session, self._collected, state)
+        return state
+
+    def closed(self, state):
+        state["closed"] = True
+        self.closed_total += 1
+
+    def _collected(self, state):
+        if not state["closed"]:
+            self.leaked_total += 1
+
+    def stats(self):
+        return {
+            "opened": self.opened_total,
+            "closed": self.closed_total,
+            "active": self.opened_total - self.closed_total,
+            "leaked": self.leaked_total,
+        }
+
+def create_pooled_engine(db_url, metrics):
+    engine = create_async_engine(
+        async_database_url(db_url),
+        poolclass=instrumented_pool_class(AsyncAdaptedQueuePool, metrics),
+        **pool_options()
+    )
+    instrument_queries(engine.sync_engine, metrics)
+    return engine
+
+def pool_options():
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", "30")),
+        # Recycle before Azure's load balancer drops idle connections
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+    }
+
+# Map a sync database url to its async driver, e.g. postgresql:// -> postgresql+asyncpg://
+ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(db_url):
+    url = make_url(db_url)
+    drivername = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    if drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        # asyncpg doesn't understand libpq's sslmode, it expects ssl instead
+        query = dict(url.query)
+        query["ssl"] = query.pop("sslmode")
+        url = url.set(query=query)
+    return url.set(drivername=drivername)
 
 def create_manager():
     DATABASE_URL = os.environ["POSTGRES_URL"]
-    return DatabaseManager(db_url=DATABASE_URL)
\ No newline at end of file
+    # Comma-separated list of read replica urls, optional
+    REPLICA_URLS = [url.strip() for url in os.environ.get("POSTGRES_REPLICA_URLS", "").split(",") if url.strip()]
+    return DatabaseManager(db_url=DATABASE_URL, replica_urls=REPLICA_URLS)
\ No newline at end of file
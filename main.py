@@ -1,9 +1,17 @@
+from dotenv import load_dotenv
+# Load .env before the controllers import modules that read their settings at import time
+load_dotenv()
+from utils.logger import setup_logging, stop_logging, RequestIdMiddleware
+# Before anything logs, so every record goes through the background queue
+setup_logging()
+import logging
 from fastapi import FastAPI, Request, Form, status
 from fastapi.responses import HTMLResponse, FileResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import uvicorn
 from database import create_manager
+from utils.session_store import session_store
 from controllers.AuthController import AuthController
 from controllers.ChatController import ChatController
 from controllers.FeedbackController import FeedbackController
@@ -11,15 +19,22 @@ from controllers.WebSocketControlller import WebSocketController
 from controllers.OllamaWebSocketControlller import OllamaWebSocketController
 from controllers.BlogController import BlogController
 from controllers.BlogV2Controller import BlogV2Controller
-from dotenv import load_dotenv
-load_dotenv()
+from controllers.DatabaseController import DatabaseController
+from controllers.MetricsController import MetricsController
+from controllers.ProfilerController import ProfilerController
+from utils.http_metrics import MetricsMiddleware
+from utils.loop_watchdog import watchdog_from_env
+logger = logging.getLogger(__name__)
 app = FastAPI()
+app.add_middleware(MetricsMiddleware, router_app=app)
+# Added last so it is outermost and the request id covers the whole request
+app.add_middleware(RequestIdMiddleware)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
-    print('Request for index page received')
+    logger.debug('Request for index page received')
     return templates.TemplateResponse('index.html', {"request": request})
 
 @app.get('/favicon.ico')
@@ -31,17 +46,31 @@ async def favicon():
 @app.post('/hello', response_class=HTMLResponse)
 async def hello(request: Request, name: str = Form(...)):
     if name:
-        print('Request for hello page received with name=%s' % name)
+        logger.info('Request for hello page received with name=%s', name)
         return templates.TemplateResponse('hello.html', {"request": request, 'name':name})
     else:
-        print('Request for hello page received with no name or blank name -- redirecting')
+        logger.info('Request for hello page received with no name or blank name -- redirecting')
         return RedirectResponse(request.url_for("index"), status_code=status.HTTP_302_FOUND)
 manager = create_manager()
-session = manager.Session()
-session.query()
-for Controller in [AuthController, ChatController, FeedbackController, WebSocketController, OllamaWebSocketController, BlogController, BlogV2Controller]:
+for Controller in [AuthController, ChatController, FeedbackController, WebSocketController, OllamaWebSocketController, BlogController, BlogV2Controller, DatabaseController, MetricsController, ProfilerController]:
     cls = Controller(app, manager)
     cls.setup()   
+
+loop_watchdog = watchdog_from_env()
+
+@app.on_event("startup")
+async def start_loop_watchdog():
+    if loop_watchdog:
+        loop_watchdog.start()
+
+@app.on_event("shutdown")
+async def dispose_database():
+    if loop_watchdog:
+        await loop_watchdog.stop()
+    await manager.dispose()
+    await session_store.close()
+    stop_logging()
+
 def main():
     uvicorn.run('main:app', host='0.0.0.0', port=8000)
 if __name__ == '__main__':
@@ -0,0 +1,82 @@
+import importlib
+import logging
+import pkgutil
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, TIMESTAMP, select, text, update, insert
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+logger = logging.getLogger(__name__)
+
+# Each module in migrations/versions defines `revision`, `description`, `upgrade(connection)` and
+# optionally `transactional = False` for statements like CREATE INDEX CONCURRENTLY that can't run
+# inside a transaction.
+metadata = MetaData()
+
+schema_version = Table(
+    "schema_version", metadata,
+    Column("version", Integer, nullable=False),
+    Column("description", String, nullable=True),
+    Column("applied_at", TIMESTAMP, nullable=True),
+)
+
+class MigrationError(Exception):
+    """A migration refused to run against the data it found; the message says what to fix."""
+
+# Arbitrary key for pg_advisory_lock so concurrent upgrades from several workers run one at a time
+ADVISORY_LOCK_KEY = 7266504
+
+def load_migrations():
+    from migrations import versions
+    migrations = []
+    for module_info in pkgutil.iter_modules(versions.__path__):
+        migrations.append(importlib.import_module(f"{versions.__name__}.{module_info.name}"))
+    migrations.sort(key=lambda migration: migration.revision)
+    return migrations
+
+def head_revision():
+    migrations = load_migrations()
+    return migrations[-1].revision if migrations else 0
+
+def current_revision(connection):
+    try:
+        # Own transaction, so a missing table on Postgres doesn't abort the caller's transaction
+        with connection.begin():
+            return connection.execute(select(schema_version.c.version)).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        return 0
+
+def _set_revision(connection, migration):
+    values = {"version": migration.revision, "description": migration.description, "applied_at": datetime.now()}
+    if connection.execute(update(schema_version).values(**values)).rowcount == 0:
+        connection.execute(insert(schema_version).values(**values))
+
+def upgrade(engine, target=None):
+    applied = []
+    with engine.connect() as connection:
+        is_postgres = connection.dialect.name == "postgresql"
+        if is_postgres:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            connection.commit()
+        try:
+            with connection.begin():
+                metadata.create_all(connection, checkfirst=True)
+            current = current_revision(connection)
+            for migration in load_migrations():
+                if migration.revision <= current or (target is not None and migration.revision > target):
+                    continue
+                if getattr(migration, "transactional", True):
+                    with connection.begin():
+                        migration.upgrade(connection)
+                        _set_revision(connection, migration)
+                else:
+                    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as autocommit:
+                        migration.upgrade(autocommit)
+                    with connection.begin():
+                        _set_revision(connection, migration)
+                applied.append(migration.revision)
+                logger.info("Applied migration %s: %s", migration.revision, migration.description)
+        finally:
+            if is_postgres:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                connection.commit()
+    return applied
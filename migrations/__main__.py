@@ -0,0 +1,40 @@
+import argparse
+import logging
+import os
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+from migrations import upgrade, current_revision, head_revision, load_migrations
+
+def main():
+    load_dotenv()
+    # Applied migrations are reported through the migrations logger
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="Manage the database schema.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = subparsers.add_parser("upgrade", help="Apply pending migrations")
+    upgrade_parser.add_argument("--target", type=int, default=None, help="Stop at this revision")
+    subparsers.add_parser("current", help="Show the revision the database is at")
+    subparsers.add_parser("history", help="List all migrations")
+    parser.add_argument("--url", default=None, help="Database url, defaults to POSTGRES_URL")
+    args = parser.parse_args()
+
+    if args.command == "history":
+        for migration in load_migrations():
+            print(f"{migration.revision}: {migration.description}")
+        return
+
+    engine = create_engine(args.url or os.environ["POSTGRES_URL"], poolclass=NullPool)
+    try:
+        if args.command == "upgrade":
+            applied = upgrade(engine, target=args.target)
+            if not applied:
+                print("Database is up to date.")
+        elif args.command == "current":
+            with engine.connect() as connection:
+                print(f"Current revision: {current_revision(connection)} (head: {head_revision()})")
+    finally:
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
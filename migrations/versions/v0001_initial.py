@@ -0,0 +1,78 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, Text, Boolean, ForeignKey, TIMESTAMP, func
+from sqlalchemy.dialects.postgresql import UUID
+from uuid import uuid4
+
+revision = 1
+description = "Initial schema"
+transactional = True
+
+# Snapshot of the tables as they were created by Base.metadata.create_all. checkfirst keeps
+# this a no-op on databases that were set up before migrations existed.
+metadata = MetaData()
+
+Table(
+    "chat_users", metadata,
+    Column("user_id", Integer, primary_key=True, index=True),
+    Column("email", String, nullable=False),
+    Column("username", String, nullable=False),
+    Column("password", String, nullable=False),
+    Column("access_token", String, nullable=False),
+    Column("token_expire_date", TIMESTAMP, default=func.now()),
+    Column("created_at", TIMESTAMP, default=func.now()),
+)
+
+Table(
+    "conversations", metadata,
+    Column("conversation_id", Integer, primary_key=True, index=True),
+    Column("title", String, nullable=True),
+    Column("user_id", Integer, ForeignKey("chat_users.user_id")),
+    Column("created_at", TIMESTAMP, default=func.now()),
+)
+
+Table(
+    "messages", metadata,
+    Column("message_id", Integer, primary_key=True, index=True),
+    Column("conversation_id", Integer, ForeignKey("conversations.conversation_id")),
+    Column("message_text", Text, nullable=False),
+    Column("is_bot_message", Boolean, default=False),
+    Column("sent_at", TIMESTAMP, default=func.now()),
+)
+
+Table(
+    "preferences", metadata,
+    Column("preference_id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("chat_users.user_id")),
+    Column("language", String, default="en"),
+    Column("theme", String, default="light"),
+)
+
+Table(
+    "user_feedbacks", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("chat_users.user_id")),
+    Column("contact", String, default=""),
+    Column("title", String, default=""),
+    Column("content", String, default=""),
+    Column("created_at", TIMESTAMP, default=func.now()),
+)
+
+Table(
+    "blogs", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("chat_users.user_id")),
+    Column("title", String(255)),
+    Column("content", Text),
+    Column("created_at", TIMESTAMP, default=func.now()),
+)
+
+Table(
+    "blogs_v2", metadata,
+    Column("id", UUID(as_uuid=True), primary_key=True, default=uuid4),
+    Column("user_id", Integer, ForeignKey("chat_users.user_id")),
+    Column("title", String(255)),
+    Column("content", Text),
+    Column("created_at", TIMESTAMP, default=func.now()),
+)
+
+def upgrade(connection):
+    metadata.create_all(connection, checkfirst=True)
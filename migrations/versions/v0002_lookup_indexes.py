@@ -0,0 +1,48 @@
+from sqlalchemy import text
+from migrations import MigrationError
+
+revision = 2
+description = "Indexes for token, email and per-user listing lookups"
+# CREATE INDEX CONCURRENTLY can't run inside a transaction
+transactional = False
+
+INDEXES = [
+    ("ix_chat_users_email", "chat_users", "email", True),
+    ("ix_chat_users_access_token", "chat_users", "access_token", True),
+    ("ix_blogs_user_id_created_at", "blogs", "user_id, created_at", False),
+    ("ix_blogs_v2_user_id_created_at", "blogs_v2", "user_id, created_at", False),
+    ("ix_user_feedbacks_user_id_created_at", "user_feedbacks", "user_id, created_at", False),
+    ("ix_messages_conversation_id_sent_at", "messages", "conversation_id, sent_at", False),
+]
+
+def check_duplicates(connection):
+    # A unique index can't be built over duplicates, and signup's ON CONFLICT (email) needs it
+    problems = []
+    for _, table, column, unique in INDEXES:
+        if not unique:
+            continue
+        duplicates = connection.execute(text(
+            f"SELECT {column}, count(*) FROM {table} WHERE {column} IS NOT NULL "
+            f"GROUP BY {column} HAVING count(*) > 1 LIMIT 5"
+        )).all()
+        if duplicates:
+            examples = ", ".join(f"{value!r} ({count} rows)" for value, count in duplicates)
+            problems.append(f"{table}.{column} has duplicate values, e.g. {examples}")
+    if problems:
+        raise MigrationError("Can't add unique indexes: " + "; ".join(problems) + ". Remove or merge the duplicate rows and run the upgrade again.")
+
+def upgrade(connection):
+    check_duplicates(connection)
+    is_postgres = connection.dialect.name == "postgresql"
+    for name, table, columns, unique in INDEXES:
+        if is_postgres:
+            # A failed concurrent build leaves an invalid index behind that IF NOT EXISTS would skip
+            invalid = connection.execute(text(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+            ), {"name": name}).first()
+            if invalid:
+                connection.execute(text(f"DROP INDEX CONCURRENTLY {name}"))
+        concurrently = "CONCURRENTLY " if is_postgres else ""
+        unique_sql = "UNIQUE " if unique else ""
+        connection.execute(text(f"CREATE {unique_sql}INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({columns})"))
@@ -0,0 +1,16 @@
+from sqlalchemy import text
+
+revision = 3
+description = "Indexes for newest-first keyset pagination of blog listings"
+# CREATE INDEX CONCURRENTLY can't run inside a transaction
+transactional = False
+
+INDEXES = [
+    ("ix_blogs_created_at_id", "blogs", "created_at, id"),
+    ("ix_blogs_v2_created_at_id", "blogs_v2", "created_at, id"),
+]
+
+def upgrade(connection):
+    concurrently = "CONCURRENTLY " if connection.dialect.name == "postgresql" else ""
+    for name, table, columns in INDEXES:
+        connection.execute(text(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({columns})"))
@@ -0,0 +1,19 @@
+from sqlalchemy import MetaData, Table, Column, Integer, String, Boolean, TIMESTAMP, func
+
+revision = 4
+description = "Checkpoint table for resumable data migrations"
+transactional = True
+
+metadata = MetaData()
+
+Table(
+    "migration_checkpoints", metadata,
+    Column("name", String, primary_key=True),
+    Column("last_id", Integer, nullable=False, default=0),
+    Column("migrated", Integer, nullable=False, default=0),
+    Column("done", Boolean, nullable=False, default=False),
+    Column("updated_at", TIMESTAMP, default=func.now()),
+)
+
+def upgrade(connection):
+    metadata.create_all(connection, checkfirst=True)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Any, List
+from pydantic import BaseModel, Field
+from typing import Any, List, Optional
 from datetime import datetime
 from uuid import UUID
 
@@ -54,6 +54,8 @@ class ChatModel(BaseModel):
 class CommonResponse(BaseModel):
     message: str
     data: Any
+    # Set on paginated listings when there are more rows to fetch
+    next_cursor: Optional[str] = None
 ## Feedback
 class FeedBackModel(BaseModel):
     user_id: int
@@ -74,6 +76,17 @@ class BlogModel(BaseModel):
     title: str
     content: str
 
+# Largest batch accepted by the bulk blog endpoints
+MAX_BULK_BLOGS = 5000
+
+class BlogBulkItem(BaseModel):
+    title: str
+    content: str
+
+class BlogBulkModel(BaseModel):
+    user_id: int
+    blogs: List[BlogBulkItem] = Field(..., min_length=1, max_length=MAX_BULK_BLOGS)
+
 class BlogEditModel(BaseModel):
     id: int
     user_id: int
@@ -90,8 +103,25 @@ class BlogResponse(BaseModel):
     title: str
     content: str
     created_at: datetime
+
+class BlogSummaryResponse(BaseModel):
+    id: int
+    user_id: int
+    title: str
+    created_at: datetime
+    excerpt: Optional[str] = None
     
 ## BlogV2
+class BlogV2BulkItem(BaseModel):
+    # Set to update an existing post of the same user instead of creating one
+    id: Optional[UUID] = None
+    title: str
+    content: str
+
+class BlogV2BulkModel(BaseModel):
+    user_id: int
+    blogs: List[BlogV2BulkItem] = Field(..., min_length=1, max_length=MAX_BULK_BLOGS)
+
 class BlogV2EditModel(BaseModel):
     id: UUID
     user_id: int
@@ -108,6 +138,14 @@ class BlogV2Response(BaseModel):
     title: str
     content: str
     created_at: datetime
+
+class BlogV2SummaryResponse(BaseModel):
+    id: UUID
+    user_id: int
+    title: str
+    created_at: datetime
+    excerpt: Optional[str] = None
+
 class WebSocketMessage(BaseModel):
     from_id: int 
     to_id: int 
@@ -1 +1,2 @@
+python -m migrations upgrade
 python -m uvicorn main:app --host 0.0.0.0
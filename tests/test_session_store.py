@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from utils.session_store import RedisError, RedisSessionStore
+
+class FakeRedis:
+    """Just enough of a RESP server for GET, SET and DEL. Replies to keys in `slow` are delayed."""
+
+    def __init__(self):
+        self.data = {}
+        self.slow = set()
+        self.connections = 0
+        self.writers = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.writers.append(writer)
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    return
+                args = []
+                for _ in range(int(header[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2].decode())
+                command, *rest = args
+                if rest and rest[0] in self.slow:
+                    await asyncio.sleep(0.2)
+                writer.write(self.reply(command.upper(), rest))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def reply(self, command, args):
+        if command == "GET":
+            value = self.data.get(args[0])
+            return b"$-1\r\n" if value is None else f"${len(value.encode())}\r\n{value}\r\n".encode()
+        if command == "SET":
+            self.data[args[0]] = args[1]
+            return b"+OK\r\n"
+        if command == "DEL":
+            return f":{int(self.data.pop(args[0], None) is not None)}\r\n".encode()
+        return f"-ERR unknown command '{command}'\r\n".encode()
+
+    def drop_connections(self):
+        for writer in self.writers:
+            writer.close()
+        self.writers.clear()
+
+    async def close(self):
+        self.drop_connections()
+        self.server.close()
+        await self.server.wait_closed()
+
+def run(test):
+    async def main():
+        server = FakeRedis()
+        store = RedisSessionStore(port=await server.start(), timeout=1.0)
+        try:
+            await test(server, store)
+        finally:
+            await store.close()
+            await server.close()
+    asyncio.run(main())
+
+def test_replies():
+    async def test(server, store):
+        await store.set("token:a", "user-a", 60)
+        assert await store.get("token:a") == "user-a"
+        assert await store.get("token:missing") is None
+        await store.delete("token:a")
+        assert await store.get("token:a") is None
+        with pytest.raises(RedisError):
+            await store.execute("PING")
+    run(test)
+
+def test_reconnects_after_the_connection_drops():
+    async def test(server, store):
+        await store.set("token:a", "user-a", 60)
+        server.drop_connections()
+        await asyncio.sleep(0.05)
+        with pytest.raises(ConnectionError):
+            await store.get("token:a")
+        assert await store.get("token:a") == "user-a"
+        assert server.connections == 2
+    run(test)
+
+def test_cancelled_command_does_not_leak_its_reply():
+    async def test(server, store):
+        await store.set("token:a", "user-a", 60)
+        await store.set("token:b", "user-b", 60)
+        server.slow.add("token:a")
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(store.get("token:a"), 0.05)
+        # The late reply for token:a must not be read as the reply for token:b
+        assert await store.get("token:b") == "user-b"
+    run(test)
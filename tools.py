@@ -1,15 +1,18 @@
+import logging
 import json
 from datetime import datetime
 import requests
 from utils.tavily import tavily_search
 
+logger = logging.getLogger(__name__)
+
 def get_current_time():
     """Get the current time for a given location"""
     return json.dumps({"current_time": datetime.now().strftime("%I:%M %p") })
 
 def perform_calculation(operation, numbers):
     """Perform a mathematical calculation on a list of numbers"""
-    print(f"perform_calculation called with operation: {operation}, numbers: {numbers}")
+    logger.debug("perform_calculation called with operation: %s, numbers: %s", operation, numbers)
     if operation == "add":
         result = sum(numbers)
     elif operation == "subtract":
@@ -18,7 +21,7 @@ def perform_calculation(operation, numbers):
         result = 1
         for num in numbers:
             result *= num
-        print(f"Result:{result}")
+        logger.debug("Result: %s", result)
     elif operation == "divide":
         result = numbers[0]
         for num in numbers[1:]:
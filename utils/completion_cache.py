@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from utils.metrics import registry
+
+cache_requests = registry.counter("completion_cache_requests_total", "Completion cache lookups by model and result (memory, disk or miss).", ("model", "result"))
+
+# Streams bigger than this are relayed but not stored
+MAX_STREAM_BYTES = 1024 * 1024
+
+def normalize_messages(messages):
+    # Whitespace differences don't change the answer; attached files are keyed by content hash
+    return [
+        {
+            "role": message.role,
+            "content": " ".join(message.content.split()),
+            "files": [hashlib.sha256(file.content.encode()).hexdigest() for file in getattr(message, "files", None) or []],
+        }
+        for message in messages
+    ]
+
+def completion_key(model, messages, stream, tools=(), sampling=None):
+    document = {
+        "model": model,
+        "messages": normalize_messages(messages),
+        "stream": stream,
+        "tools": sorted(tools),
+        "sampling": sampling or {},
+    }
+    return hashlib.sha256(json.dumps(document, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+class DiskTier:
+    """SQLite file shared by the workers on a host; entries outlive restarts until their TTL."""
+
+    def __init__(self, path, max_rows):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS completion_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _get(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT value, expires_at FROM completion_cache WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row
+
+    def _put(self, key, value, expires_at):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO completion_cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+            self._puts += 1
+            # Prune now and then rather than on every write
+            if self._puts % 100 == 0:
+                self._connection.execute("DELETE FROM completion_cache WHERE expires_at <= ?", (time.time(),))
+                self._connection.execute("DELETE FROM completion_cache WHERE key IN (SELECT key FROM completion_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)", (self.max_rows,))
+
+    async def get(self, key):
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key, value, expires_at):
+        await asyncio.to_thread(self._put, key, value, expires_at)
+
+    def close(self):
+        self._connection.close()
+
+class CompletionCache:
+    """LRU of completion key -> cached response in front of an optional disk tier, only for the
+    models listed in `models`. Entries are {"kind": "json", "body": ...} for regular replies and
+    {"kind": "sse", "events": [...]} for streams, which are replayed event by event."""
+
+    def __init__(self, models=(), max_size=1000, ttl=3600.0, disk=None):
+        self.models = set(models)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk = disk
+        self._entries = OrderedDict()
+
+    def enabled_for(self, model):
+        return model in self.models
+
+    async def get(self, model, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                cache_requests.labels(model=model, result="memory").inc()
+                return value
+            del self._entries[key]
+        if self.disk is not None:
+            row = await self.disk.get(key)
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                cache_requests.labels(model=model, result="disk").inc()
+                return value
+        cache_requests.labels(model=model, result="miss").inc()
+        return None
+
+    async def put(self, key, value):
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        if self.disk is not None:
+            await self.disk.put(key, json.dumps(value), expires_at)
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+async def record_stream(chunks, stores):
+    """Relays a stream and hands it to each of `stores` (async callables taking the cache entry)
+    once it has completed; failed or oversized streams are not kept."""
+    body = bytearray()
+    async for chunk in chunks:
+        yield chunk
+        if len(body) <= MAX_STREAM_BYTES:
+            body += chunk.encode() if isinstance(chunk, str) else chunk
+    if len(body) <= MAX_STREAM_BYTES:
+        # Raw chunks can split events and characters, so re-split the whole body on event boundaries
+        text = body.decode("utf-8", "replace")
+        events = [event + "\n\n" for event in text.split("\n\n") if event]
+        for store in stores:
+            await store({"kind": "sse", "events": events})
+
+async def replay(events):
+    for event in events:
+        yield event
+
+def completion_cache_from_env():
+    models = [model.strip() for model in os.environ.get("COMPLETION_CACHE_MODELS", "").split(",") if model.strip()]
+    path = os.environ.get("COMPLETION_CACHE_PATH")
+    size = int(os.environ.get("COMPLETION_CACHE_SIZE", "1000"))
+    return CompletionCache(
+        models=models,
+        max_size=size,
+        ttl=float(os.environ.get("COMPLETION_CACHE_TTL", "3600")),
+        disk=DiskTier(path, max_rows=size * 10) if path and models else None,
+    )
+
+completion_cache = completion_cache_from_env()
@@ -1,24 +1,18 @@
-from utils.llm_provider import LLMProvider
-import uuid
+import asyncio
+import logging
+from utils.llm_provider import LLMProvider, model_id
 from models import ChatModel, CommonResponse, Message
-import os
-import openai
+from tools import get_tools, handle_tool_call
+from utils.openai_clients import get_gpt4omini_client
 
-def get_gpt4omini_client():
-    api_key = os.environ["AZURE_OPENAI_API_KEY"]
-    api_version = "2024-05-01-preview"
-    client = openai.AzureOpenAI(
-        azure_endpoint="https://ai-lonnieqin6583ai982841037486.openai.azure.com/",
-        api_key=api_key,
-        api_version=api_version
-    )
-    return client
+logger = logging.getLogger(__name__)
 
 class ContentCreationProvider(LLMProvider):
 
-    def get_model(self):
+    @classmethod
+    def get_model(cls):
         return ChatModel(
-            id = str(uuid.uuid4()), 
+            id = model_id("gpt-4o-mini-content-creation"), 
             model="gpt-4o-mini-content-creation", 
             displayName="gpt-4o-mini(Function Calling)", 
             provider="OpenAI", 
@@ -26,14 +20,17 @@ class ContentCreationProvider(LLMProvider):
             description="GPT-4o-Mini, a cutting-edge AI language model designed to offer powerful AI capabilities in a compact and accessible format. Building on the successes of its predecessors, GPT-4o-Mini retains the advanced understanding and language generation abilities that have made the GPT series a favorite among developers and researchers."
         )
 
+    def create_client(self, http_client):
+        return get_gpt4omini_client(http_client)
+
     async def execute(self, conversation):
         deployment = "gpt-4o-mini"
-        client = get_gpt4omini_client()
+        client = self.get_client()
         tools = get_tools()
         messages = []
         for message in conversation.messages:
             messages.append({"role": message.role, "content": message.content})
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             messages=messages,
             model=deployment,
             tools=tools,
@@ -44,11 +41,11 @@ class ContentCreationProvider(LLMProvider):
             # Handle function calls
         if response_message.tool_calls:
             for tool_call in response_message.tool_calls:
-                response = handle_tool_call(tool_call)
+                response = await asyncio.to_thread(handle_tool_call, tool_call)
                 if response != None:
                     messages.append(response)
-                    print(f"Return a response:{response}")
-            final_response = client.chat.completions.create(
+                    logger.debug("Tool call returned %s", response["name"])
+            final_response = await client.chat.completions.create(
                 model=deployment,
                 messages=messages,
             )
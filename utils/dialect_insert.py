@@ -0,0 +1,14 @@
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql, sqlite
+
+# INSERT constructs with ON CONFLICT support, by dialect name
+DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+def dialect_insert(session, model):
+    dialect = session.bind.dialect.name
+    if dialect not in DIALECT_INSERTS:
+        raise HTTPException(501, detail=f"Upserts are not supported on {dialect}")
+    return DIALECT_INSERTS[dialect](model)
@@ -1,10 +1,13 @@
-from utils.llm_provider import LLMProvider
-import uuid
+import asyncio
+import logging
+from utils.llm_provider import LLMProvider, model_id
 from models import ChatModel, CommonResponse, Message
 import os
 import base64
 from google.genai import types, Client
 
+logger = logging.getLogger(__name__)
+
 def get_current_weather(location: str) -> str:
     """Get the current whether in a given location.
 
@@ -12,7 +15,7 @@ def get_current_weather(location: str) -> str:
         location: required, The city and state, e.g. San Franciso, CA
         unit: celsius or fahrenheit
     """
-    print(f'Called with: {location=}')
+    logger.debug('get_current_weather called with location=%s', location)
     return "23C"
 
 def convert_base64_to_file(base64_string, fileName):
@@ -26,7 +29,7 @@ def convert_base64_to_file(base64_string, fileName):
     # Write the binary data to a file
     with open(output_file_path, 'wb') as file:
         file.write(binary_data)
-    print(f"File saved as: {output_file_path}")
+    logger.debug("File saved as: %s", output_file_path)
     return output_file_path
 
 class GeminiProvider(LLMProvider):
@@ -36,9 +39,10 @@ class GeminiProvider(LLMProvider):
         self.client = Client(api_key=os.environ["GEMINI_API_KEY"])
 
 
-    def get_model(self):
+    @classmethod
+    def get_model(cls):
         return ChatModel(
-            id = str(uuid.uuid4()), 
+            id = model_id("gemini-2.0-flash"), 
             model="gemini-2.0-flash", 
             displayName="Gemini 2.0 Flash", 
             provider="Google", 
@@ -64,9 +68,9 @@ class GeminiProvider(LLMProvider):
         if len(user_message.files) > 0:
             for file in user_message.files:
                 if file.mine_type == "image/jpeg":
-                    file_path = convert_base64_to_file(file.content, file.file_name)
-                    url = self.client.files.upload(file=file_path)
-                    print(f"Saved file to {url}")
+                    file_path = await asyncio.to_thread(convert_base64_to_file, file.content, file.file_name)
+                    url = await self.client.aio.files.upload(file=file_path)
+                    logger.debug("Uploaded file %s", url)
                     contents.append(url)
         messages.append(
             types.Content(
@@ -75,17 +79,16 @@ class GeminiProvider(LLMProvider):
             )
         )
         try:
-            response = self.client.models.generate_content(
+            response = await self.client.aio.models.generate_content(
                 model='gemini-2.0-flash', 
                 contents=messages
             )
-            print("Response:", response)
             return CommonResponse(
                 message="", 
                 data=[Message(role="assistant", content=response.candidates[0].content.parts[0].text)]
             )
         except Exception as e:
-            print("error", e)
+            logger.exception("Gemini request failed")
             return CommonResponse(
                 message="Error", 
                 data=[]
@@ -0,0 +1,45 @@
+import time
+from starlette.routing import Match
+from utils.metrics import registry
+
+http_requests = registry.counter("http_requests_total", "HTTP requests by route template, method and status.", ("route", "method", "status"))
+http_latency = registry.histogram("http_request_duration_seconds", "Time until the response body was sent, by route template, method and status.", ("route", "method", "status"))
+http_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being handled, by route template.", ("route",))
+
+def route_template(app, scope):
+    # Label by template (/blogs/v2/{blog_id}) rather than path so every blog id shares one series
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests per route."""
+
+    def __init__(self, app, router_app):
+        self.app = app
+        self.router_app = router_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route = route_template(self.router_app, scope)
+        status = 500
+        in_flight = http_in_flight.labels(route=route)
+        in_flight.inc()
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            labels = {"route": route, "method": scope["method"], "status": status}
+            http_requests.labels(**labels).inc()
+            http_latency.labels(**labels).observe(time.perf_counter() - start)
@@ -1,38 +1,158 @@
+import anyio
 import asyncio
 import httpx
+import logging
+import os
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
 from models import CommonResponse
+from utils.metrics import registry
+import time
+import uuid
+
+llm_latency = registry.histogram("llm_request_duration_seconds", "Time for a provider to produce its response, by model and outcome. Streamed replies are timed until the stream is handed back.", ("model", "outcome"))
+llm_stream_latency = registry.histogram("llm_stream_duration_seconds", "Time to relay a streamed completion, by model and outcome.", ("model", "outcome"))
+llm_stream_first_byte = registry.histogram("llm_stream_first_byte_seconds", "Time from sending a streamed request upstream to relaying its first bytes.", ("model",))
+
+logger = logging.getLogger(__name__)
+
+# Optional server-side coalescing of relayed chunks: fewer, larger writes at the cost of a little latency
+STREAM_COALESCE_BYTES = int(os.environ.get("LLM_STREAM_COALESCE_BYTES", "0"))
+STREAM_COALESCE_SECONDS = float(os.environ.get("LLM_STREAM_COALESCE_MS", "20")) / 1000
+
+# Model ids are derived from the model name so clients can keep them across restarts
+MODEL_ID_NAMESPACE = uuid.UUID("5b0c3a1e-8f7d-4c52-9a36-2f1d0e6b7c84")
+
+def model_id(model):
+    return str(uuid.uuid5(MODEL_ID_NAMESPACE, model))
+
 class LLMProvider:
+    # Besides the model and messages, what shapes a completion; both go into the completion cache key
+    sampling_params = {}
+    tool_names = ()
 
     def __init__(self, chat_controller):
         self.chat_controller = chat_controller
-        
+        self._client = None
+
+    def get_client(self):
+        # Built on first use and kept: creating an SDK client per request throws away its connections
+        if self._client is None:
+            self._client = self.create_client(self.chat_controller.client)
+        return self._client
+
+    def create_client(self, http_client):
+        return None
 
-    def get_model(self):
+    @classmethod
+    def get_model(cls):
         return None
 
     async def execute(self, conversation):
         pass
 
     async def common_request(self, url, headers, payload, stream):
-        async def stream_chat_completion():
-            async with self.chat_controller.client.stream("POST", url, json=payload, headers=headers) as response:
-                async for chunk in response.aiter_text():
-                    yield chunk
-                    await asyncio.sleep(0.1) 
+        client = self.chat_controller.client
         if stream:
-            return StreamingResponse(
-                stream_chat_completion(),
-                media_type="text/event-stream"
-            )
+            # identity keeps the upstream bytes uncompressed so they can be relayed as they are
+            start = time.perf_counter()
+            request = client.build_request("POST", url, json=payload, headers={**headers, "Accept-Encoding": "identity"})
+            response = await client.send(request, stream=True)
+            if response.is_error:
+                await response.aread()
+                await response.aclose()
+                raise HTTPException(status_code=response.status_code, detail=response.text)
+            return SSEResponse(relay_stream(response, payload.get("model", "unknown"), start))
         else:
             try:
-                async with self.client.post(url, headers=headers, json=payload) as response:
-                    response.raise_for_status()
-                    json = await response.json()
-                    return CommonResponse(message="", data=json)
+                response = await client.post(url, headers=headers, json=payload)
+                response.raise_for_status()
+                return CommonResponse(message="", data=response.json())
             except httpx.HTTPStatusError as e:
                 raise HTTPException(status_code=e.response.status_code, detail=str(e))
             except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+                raise HTTPException(status_code=500, detail=str(e))
+
+def sse_event(data):
+    # An event ends with a blank line; a single newline leaves clients waiting for the rest of it
+    return f"data: {data}\n\n"
+
+SSE_DONE = sse_event("[DONE]")
+
+class SSEResponse(StreamingResponse):
+    """text/event-stream response that stops its body iterator as soon as the client disconnects,
+    whatever ASGI spec version the server speaks, so the upstream request is cancelled with it."""
+
+    def __init__(self, content, **kwargs):
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **kwargs.pop("headers", {})}
+        super().__init__(content, media_type="text/event-stream", headers=headers, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        async with anyio.create_task_group() as task_group:
+            async def stream():
+                await self.stream_response(send)
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(stream)
+            await self.listen_for_disconnect(receive)
+            # Only reached when the client went away first
+            logger.info("Client disconnected, cancelling the stream")
+            task_group.cancel_scope.cancel()
+        # Run after the stream either way, as StreamingResponse does
+        if self.background is not None:
+            await self.background()
+
+async def relay_stream(response, model, start):
+    """Passes the upstream bytes through unchanged (they are already SSE framed), optionally
+    coalescing small chunks, and closes the upstream response however the relay ends."""
+    outcome, first_byte = "error", None
+    try:
+        async for chunk in coalesce(response.aiter_raw(), STREAM_COALESCE_BYTES, STREAM_COALESCE_SECONDS):
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+                llm_stream_first_byte.labels(model=model).observe(first_byte)
+            yield chunk
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "disconnected"
+        raise
+    finally:
+        await response.aclose()
+        llm_stream_latency.labels(model=model, outcome=outcome).observe(time.perf_counter() - start)
+
+async def coalesce(chunks, max_bytes, max_delay):
+    """Merges chunks until `max_bytes` are buffered or the oldest has waited `max_delay` seconds.
+    With max_bytes <= 0 chunks are passed straight through."""
+    if max_bytes <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+    loop = asyncio.get_running_loop()
+    iterator = chunks.__aiter__()
+    buffer, deadline, pending = bytearray(), None, None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = max(0.0, deadline - loop.time()) if buffer else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield bytes(buffer)
+                buffer.clear()
+                continue
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+            if not buffer:
+                deadline = loop.time() + max_delay
+            buffer += chunk
+            if len(buffer) >= max_bytes:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -1,29 +1,20 @@
+import logging
+import asyncio
 import os 
-import openai
 from models import Message, CommonResponse, ChatModel
-from tools import get_tools
-from fastapi.responses import StreamingResponse
 from tools import get_tools, handle_tool_call
-from openai import OpenAI
 import json
-import uuid
-from utils.llm_provider import LLMProvider
-
-def get_gpt4omini_client():
-    api_key = os.environ["AZURE_OPENAI_API_KEY"]
-    api_version = "2024-05-01-preview"
-    client = openai.AzureOpenAI(
-        azure_endpoint="https://ai-lonnieqin6583ai982841037486.openai.azure.com/",
-        api_key=api_key,
-        api_version=api_version
-    )
-    return client
+from utils.llm_provider import LLMProvider, SSEResponse, SSE_DONE, model_id, sse_event
+from utils.openai_clients import get_gpt4omini_client, get_nvdia_client
+
+logger = logging.getLogger(__name__)
 
 class GPT4OMiniProvider(LLMProvider):
 
-    def get_model(self):
+    @classmethod
+    def get_model(cls):
         return ChatModel(
-            id = str(uuid.uuid4()), 
+            id = model_id("gpt-4o-mini"), 
             model="gpt-4o-mini", 
             displayName="gpt-4o-mini", 
             provider="OpenAI", 
@@ -31,24 +22,27 @@ class GPT4OMiniProvider(LLMProvider):
             description="GPT-4o-Mini, a cutting-edge AI language model designed to offer powerful AI capabilities in a compact and accessible format. Building on the successes of its predecessors, GPT-4o-Mini retains the advanced understanding and language generation abilities that have made the GPT series a favorite among developers and researchers."
         )
 
+    def create_client(self, http_client):
+        return get_gpt4omini_client(http_client)
+
     async def execute(self, conversation):
         deployment = "gpt-4o-mini"
-        client = get_gpt4omini_client()
+        client = self.get_client()
         async def stream_chat_completion():
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 messages=conversation.messages,
                 model=deployment,
                 stream=True
             )
-            for chunk in response:
-                yield "data: " + chunk.to_json() + "\n"
+            # Closing the stream on the way out also cancels the upstream request on disconnect
+            async with response:
+                async for chunk in response:
+                    yield sse_event(chunk.to_json(indent=None))
+            yield SSE_DONE
         if conversation.stream:
-            return StreamingResponse(
-                stream_chat_completion(),
-                media_type="text/event-stream"
-            )
+            return SSEResponse(stream_chat_completion())
         else:
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 messages=conversation.messages,
                 model=deployment,
                 stream=False
@@ -56,10 +50,12 @@ class GPT4OMiniProvider(LLMProvider):
             return CommonResponse(message="", data=response.to_json())
 
 class GPT4OMiniFunctionCallingProvider(LLMProvider):
+    tool_names = tuple(tool["function"]["name"] for tool in get_tools())
 
-    def get_model(self):
+    @classmethod
+    def get_model(cls):
         return ChatModel(
-            id = str(uuid.uuid4()), 
+            id = model_id("gpt-4o-mini-function-calling"), 
             model="gpt-4o-mini-function-calling", 
             displayName="gpt-4o-mini(Function Calling)", 
             provider="OpenAI", 
@@ -67,14 +63,17 @@ class GPT4OMiniFunctionCallingProvider(LLMProvider):
             description="GPT-4o-Mini, a cutting-edge AI language model designed to offer powerful AI capabilities in a compact and accessible format. Building on the successes of its predecessors, GPT-4o-Mini retains the advanced understanding and language generation abilities that have made the GPT series a favorite among developers and researchers."
         )
 
+    def create_client(self, http_client):
+        return get_gpt4omini_client(http_client)
+
     async def execute(self, conversation):
         deployment = "gpt-4o-mini"
-        client = get_gpt4omini_client()
+        client = self.get_client()
         tools = get_tools()
         messages = []
         for message in conversation.messages:
             messages.append({"role": message.role, "content": message.content})
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             messages=messages,
             model=deployment,
             tools=tools,
@@ -85,11 +84,12 @@ class GPT4OMiniFunctionCallingProvider(LLMProvider):
             # Handle function calls
         if response_message.tool_calls:
             for tool_call in response_message.tool_calls:
-                response = handle_tool_call(tool_call)
+                # Tools make blocking HTTP calls (tavily, openweathermap), so keep them off the event loop
+                response = await asyncio.to_thread(handle_tool_call, tool_call)
                 if response != None:
                     messages.append(response)
-                    print(f"Return a response:{response}")
-            final_response = client.chat.completions.create(
+                    logger.debug("Tool call returned %s", response["name"])
+            final_response = await client.chat.completions.create(
                 model=deployment,
                 messages=messages,
             )
@@ -100,10 +100,12 @@ class GPT4OMiniFunctionCallingProvider(LLMProvider):
             return CommonResponse(message="", data=[Message(role=msg.role, content=msg.content)])
 
 class GPT4OMiniLangchainProvider(LLMProvider):
+    sampling_params = {"temperature": 0}
 
-    def get_model(self):
+    @classmethod
+    def get_model(cls):
         return ChatModel(
-            id = str(uuid.uuid4()), 
+            id = model_id("gpt-4o-mini-langchain"), 
             model="gpt-4o-mini-langchain", 
             displayName="gpt-4o-mini(Langchain)", 
             provider="Azure", 
@@ -111,28 +113,21 @@ class GPT4OMiniLangchainProvider(LLMProvider):
             description="GPT-4o-Mini, a cutting-edge AI language model designed to offer powerful AI capabilities in a compact and accessible format. Building on the successes of its predecessors, GPT-4o-Mini retains the advanced understanding and language generation abilities that have made the GPT series a favorite among developers and researchers."
         )
 
-    async def execute(self, conversation):
-        from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+    def create_client(self, http_client):
         from langchain_openai import AzureOpenAI
-        print("environment", os.environ)
-        llm = AzureOpenAI(
+        return AzureOpenAI(
             azure_deployment="gpt-4o-mini",  # or your deployment
             api_version="=2024-05-01-preview",
-            temperature=0,
             max_tokens=None,
+            **self.sampling_params,
             timeout=None,
             max_retries=2,
+            http_async_client=http_client,
         )
-        print(1, llm)
-        messages = [
-            (
-                "system",
-                "You are a helpful assistant that translates English to French. Translate the user sentence.",
-            ),
-            ("human", "I love programming."),
-        ]
-        result1 = await llm.invoke(messages)
-        print("3", result1)
+
+    async def execute(self, conversation):
+        from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+        llm = self.get_client()
         messages = []
         for message in conversation.messages:
             if message.role == "user":
@@ -141,18 +136,20 @@ class GPT4OMiniLangchainProvider(LLMProvider):
                 messages.append(AIMessage(message.content))
             if message.role == "system":
                 messages.append(SystemMessage(message.content))
-        print("3")
         try:
-            result = llm.invoke(messages)
-        except:
-            print("Fail")
+            result = await llm.ainvoke(messages)
+        except Exception:
+            logger.exception("Langchain completion failed")
+            raise
         return CommonResponse(message="", data=[Message(role="assistant", content=result)])
   
 class NVDIADeepSeekR1Provider(LLMProvider):
+    sampling_params = {"temperature": 0.6, "top_p": 0.7, "max_tokens": 4096}
 
-    def get_model(self):
+    @classmethod
+    def get_model(cls):
         return ChatModel(
-            id = str(uuid.uuid4()), 
+            id = model_id("nvdia-deepseek-r1"), 
             model="nvdia-deepseek-r1", 
             displayName="DeepSeek-R1", 
             provider="NVDIA", 
@@ -160,36 +157,35 @@ class NVDIADeepSeekR1Provider(LLMProvider):
             description="DeepSeek R1 in NVDIA"
         )
 
+    def create_client(self, http_client):
+        return get_nvdia_client(http_client)
+
     async def execute(self, conversation):
-        client = OpenAI(
-            base_url = "https://integrate.api.nvidia.com/v1",
-            api_key = os.environ["NVDIA_DEEPSEEK_API_KEY"]
-        )
+        client = self.get_client()
         messages = []
         for message in conversation.messages:
             messages.append({"role": message.role, "content": message.content})
         
         async def stream_chat_completion():
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model="deepseek-ai/deepseek-r1",
                 messages=messages,
-                temperature=0.6,
-                top_p=0.7,
-                max_tokens=4096,
-                stream=True
+                stream=True,
+                **self.sampling_params
             )
-            for chunk in response:
-                yield "data: " + json.dumps(chunk.to_dict()) + "\n"
-        return StreamingResponse(
-            stream_chat_completion(),
-            media_type="text/event-stream"
-        )
+            async with response:
+                async for chunk in response:
+                    yield sse_event(json.dumps(chunk.to_dict()))
+            yield SSE_DONE
+        return SSEResponse(stream_chat_completion())
     
 class DeepSeekR1Provider(LLMProvider):
- 
-    def get_model(self):
+    sampling_params = {"max_tokens": 2048}
+
+    @classmethod
+    def get_model(cls):
         return ChatModel(
-            id = str(uuid.uuid4()), 
+            id = model_id("DeepSeek-R1"), 
             model="DeepSeek-R1", 
             displayName="DeepSeek-R1", 
             provider="DeepSeek", 
@@ -212,7 +208,7 @@ class DeepSeekR1Provider(LLMProvider):
         # Define the payload
         payload = {
             "messages": items,
-            "max_tokens": 2048,
+            **self.sampling_params,
             "model": "DeepSeek-R1",
             "stream": conversation.stream
         }
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+loop_lag = registry.histogram("event_loop_lag_seconds", "How late the watchdog's periodic wake-up ran.", buckets=LAG_BUCKETS).labels()
+loop_stalls = registry.counter("event_loop_stalls_total", "Wake-ups that ran later than the stall threshold.").labels()
+loop_stall_stacks = registry.counter("event_loop_stall_stacks_total", "Stalls whose blocking stack was captured in debug mode.").labels()
+
+class LoopWatchdog:
+    """Measures event-loop lag with a periodic sleep, and in debug mode samples the loop thread's
+    stack from a helper thread whenever the loop has not checked in for longer than `threshold`."""
+
+    def __init__(self, interval=0.1, threshold=0.1, debug=False):
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+        self.max_lag = 0.0
+        self._task = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        if self.debug:
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _measure(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            lag = max(0.0, now - start - self.interval)
+            loop_lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                loop_stalls.inc()
+                if not self.debug:
+                    logger.warning("Event loop stalled for %.3f s", lag, extra={"lag_seconds": lag})
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stopped.wait(self.threshold / 2):
+            beat = self._last_beat
+            # The loop owes a beat every `interval`; anything beyond that is time it spent blocked
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.threshold or beat == reported_beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            reported_beat = beat
+            loop_stall_stacks.inc()
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning("Event loop blocked for more than %.3f s in:\n%s", blocked, stack, extra={"lag_seconds": blocked})
+
+def watchdog_from_env():
+    if os.environ.get("LOOP_WATCHDOG", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return LoopWatchdog(
+        interval=float(os.environ.get("LOOP_WATCHDOG_INTERVAL", "0.1")),
+        threshold=float(os.environ.get("LOOP_STALL_THRESHOLD", "0.1")),
+        debug=os.environ.get("LOOP_WATCHDOG_DEBUG", "false").lower() in ("1", "true", "yes"),
+    )
@@ -1,5 +1,8 @@
+import logging
 import requests
 
+logger = logging.getLogger(__name__)
+
 def create_medium_blog():
     access_token = 'YOUR_ACCESS_TOKEN'
     user_id = 'YOUR_USER_ID'
@@ -17,11 +20,9 @@ def create_medium_blog():
     }
     response = requests.post(url, headers=headers, json=data)
     if response.status_code == 201:
-        print('Post created successfully!')
-        print(response.json())
+        logger.info('Post created successfully! %s', response.json())
     else:
-        print('Failed to create post')
-        print(response.json())
+        logger.warning('Failed to create post: %s', response.json())
 
 if __name__ == "__main__":
     create_medium_blog() 
\ No newline at end of file
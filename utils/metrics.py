@@ -0,0 +1,155 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Default latency buckets in seconds, same shape as the Prometheus client defaults
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+class Histogram:
+    """Fixed-bucket histogram, safe to observe from worker threads."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"buckets": buckets, "sum": total, "count": count}
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+class Counter:
+    """Monotonic count, safe to increment from worker threads."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+class Gauge(Counter):
+    """Value that can go up and down, e.g. requests in flight."""
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+class MetricFamily:
+    """One named metric with a child Counter, Gauge or Histogram per combination of label values."""
+
+    def __init__(self, kind, name, help, labelnames, factory):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self.factory())
+        return child
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            if self.kind == "histogram":
+                snapshot = child.snapshot()
+                for bound, count in snapshot["buckets"].items():
+                    yield f"{self.name}_bucket", {**labels, "le": bound}, count
+                yield f"{self.name}_sum", labels, snapshot["sum"]
+                yield f"{self.name}_count", labels, snapshot["count"]
+            else:
+                yield self.name, labels, child.value
+
+class Registry:
+    """Metric families plus collectors that produce samples at scrape time, rendered in the
+    Prometheus text exposition format."""
+
+    def __init__(self):
+        self.families = {}
+        self.collectors = []
+
+    def _family(self, kind, name, help, labelnames, factory):
+        if name not in self.families:
+            self.families[name] = MetricFamily(kind, name, help, labelnames, factory)
+        return self.families[name]
+
+    def counter(self, name, help, labelnames=()):
+        return self._family("counter", name, help, labelnames, Counter)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._family("gauge", name, help, labelnames, Gauge)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._family("histogram", name, help, labelnames, lambda: Histogram(buckets))
+
+    def register_collector(self, collector):
+        """`collector()` returns (name, kind, help, [(labels, value), ...]) tuples."""
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for family in list(self.families.values()):
+            lines += _header(family.name, family.kind, family.help)
+            lines += [_sample(name, labels, value) for name, labels, value in family.samples()]
+        for collector in self.collectors:
+            for name, kind, help, samples in collector():
+                lines += _header(name, kind, help)
+                lines += [_sample(name, labels, value) for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+def _header(name, kind, help):
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _sample(name, labels, value):
+    if labels:
+        name += "{" + ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items()) + "}"
+    return f"{name} {_format_value(value)}"
+
+# Process-wide registry served by GET /metrics
+registry = Registry()
@@ -0,0 +1,24 @@
+import os
+import openai
+
+AZURE_OPENAI_ENDPOINT = "https://ai-lonnieqin6583ai982841037486.openai.azure.com/"
+AZURE_OPENAI_API_VERSION = "2024-05-01-preview"
+NVDIA_BASE_URL = "https://integrate.api.nvidia.com/v1"
+
+# Clients are meant to be built once and reused. Passing `http_client` (ChatController.client)
+# makes them share its connection pool; the owner of that client closes it, not the SDK.
+
+def get_gpt4omini_client(http_client=None):
+    return openai.AsyncAzureOpenAI(
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        api_key=os.environ["AZURE_OPENAI_API_KEY"],
+        api_version=AZURE_OPENAI_API_VERSION,
+        http_client=http_client
+    )
+
+def get_nvdia_client(http_client=None):
+    return openai.AsyncOpenAI(
+        base_url=NVDIA_BASE_URL,
+        api_key=os.environ["NVDIA_DEEPSEEK_API_KEY"],
+        http_client=http_client
+    )
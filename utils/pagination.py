@@ -0,0 +1,38 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Longest excerpt a summary listing may ask for, in characters
+MAX_EXCERPT_LENGTH = 500
+
+# Cursors are opaque to clients: base64 of the (created_at, id) of the last row on the page
+def encode_cursor(row):
+    payload = json.dumps([row.created_at.isoformat(), str(row.id)])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor, id_type=int):
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), id_type(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(400, detail="Invalid cursor")
+
+def keyset_page(statement, model, cursor, limit):
+    """Newest-first page of `statement` after `cursor`, fetching one extra row to detect a next page."""
+    if cursor is not None:
+        created_at, row_id = cursor
+        statement = statement.where(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < row_id)
+        ))
+    return statement.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+def split_page(rows, limit):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
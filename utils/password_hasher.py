@@ -0,0 +1,64 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Hashes written before scrypt: bare sha256 hex digests
+LEGACY_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+class PasswordHasher:
+    """scrypt password hashing run on a small dedicated thread pool so logins don't stall the event loop.
+
+    Hashes are stored as scrypt$n$r$p$salt$hash (base64 salt and hash).
+    """
+
+    def __init__(self, n=2 ** 14, r=8, p=1, workers=4):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    def _derive(self, password, salt, n, r, p):
+        # scrypt needs 128 * n * r bytes; leave headroom over OpenSSL's 32 MiB default limit
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+    def hash_sync(self, password):
+        salt = os.urandom(16)
+        digest = self._derive(password, salt, self.n, self.r, self.p)
+        return "scrypt${}${}${}${}${}".format(
+            self.n, self.r, self.p,
+            base64.b64encode(salt).decode(),
+            base64.b64encode(digest).decode()
+        )
+
+    def verify_sync(self, password, stored):
+        """Returns (matches, needs_rehash)."""
+        if LEGACY_SHA256.match(stored):
+            matches = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+            return matches, matches
+        try:
+            scheme, n, r, p, salt, digest = stored.split("$")
+            n, r, p = int(n), int(r), int(p)
+            salt, digest = base64.b64decode(salt), base64.b64decode(digest)
+        except ValueError:
+            return False, False
+        if scheme != "scrypt":
+            return False, False
+        matches = hmac.compare_digest(self._derive(password, salt, n, r, p), digest)
+        return matches, matches and (n, r, p) != (self.n, self.r, self.p)
+
+    async def hash(self, password):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.hash_sync, password)
+
+    async def verify(self, password, stored):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.verify_sync, password, stored)
+
+password_hasher = PasswordHasher(
+    n=int(os.environ.get("PASSWORD_SCRYPT_N", str(2 ** 14))),
+    r=int(os.environ.get("PASSWORD_SCRYPT_R", "8")),
+    p=int(os.environ.get("PASSWORD_SCRYPT_P", "1")),
+    workers=int(os.environ.get("PASSWORD_HASH_WORKERS", "4")),
+)
@@ -0,0 +1,75 @@
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from utils.metrics import registry
+
+pool_wait = registry.histogram("db_pool_wait_seconds", "Time spent waiting to check a connection out of the pool.", ("pool",))
+pool_timeouts = registry.counter("db_pool_timeouts_total", "Checkouts that gave up after pool_timeout.", ("pool",))
+query_latency = registry.histogram("db_query_duration_seconds", "Statement execution time by pool and statement kind.", ("pool", "statement"))
+query_errors = registry.counter("db_query_errors_total", "Statements that raised, by pool and statement kind.", ("pool", "statement"))
+
+STATEMENT_KINDS = ("select", "insert", "update", "delete", "with")
+
+class PoolMetrics:
+    """Checkout wait times and timeouts for one connection pool."""
+
+    def __init__(self, name):
+        self.name = name
+        self.wait_seconds = pool_wait.labels(pool=name)
+        self.timeouts = pool_timeouts.labels(pool=name)
+
+def instrumented_pool_class(pool_class, metrics):
+    # The pool recreates itself from its class on dispose(), so the metrics live on a subclass
+    # instead of the pool instance.
+    class InstrumentedPool(pool_class):
+
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            except PoolTimeoutError:
+                metrics.timeouts.inc()
+                raise
+            finally:
+                metrics.wait_seconds.observe(time.perf_counter() - start)
+
+    InstrumentedPool.__name__ = f"Instrumented{pool_class.__name__}"
+    # SQLAlchemy names the pool's logger after the class module; keep it under sqlalchemy.pool
+    InstrumentedPool.__module__ = pool_class.__module__
+    return InstrumentedPool
+
+def statement_kind(statement):
+    kind = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+    return kind if kind in STATEMENT_KINDS else "other"
+
+def instrument_queries(engine, metrics):
+    """Times every statement run on `engine` (a sync Engine, e.g. AsyncEngine.sync_engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        start = connection.info["query_start"].pop()
+        query_latency.labels(pool=metrics.name, statement=statement_kind(statement)).observe(time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        query_errors.labels(pool=metrics.name, statement=statement_kind(context.statement or "")).inc()
+
+def pool_stats(engine, metrics):
+    pool = engine.pool
+    return {
+        "name": metrics.name,
+        "pool_class": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "timeouts": int(metrics.timeouts.value),
+        "wait_seconds": metrics.wait_seconds.snapshot(),
+    }
@@ -0,0 +1,71 @@
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+class SamplingProfiler:
+    """Samples the stack of every thread in the process at a fixed interval and aggregates them
+    as collapsed stacks ("thread;outer;...;inner count"), the input format of flamegraph.pl and
+    speedscope."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+
+    def run(self, seconds):
+        """Blocks the calling thread for `seconds` while sampling; call it off the event loop."""
+        own_thread = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_thread:
+                    self.stacks[collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+        return self
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def collapse(thread_name, frame):
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    frames.append(thread_name)
+    # Frames are separated by semicolons; the count follows the last space
+    return ";".join(frame.replace(";", ",") for frame in reversed(frames))
+
+class AllocationTracker:
+    """Top allocation sites over a window, using tracemalloc if nothing else has started it."""
+
+    def __init__(self, frames=10):
+        self.frames = frames
+        self._started = False
+        self._before = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started = True
+        self._before = tracemalloc.take_snapshot()
+
+    def stop(self, limit=20):
+        # Leave out the snapshots' own bookkeeping
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+        if self._started:
+            # Tracing costs memory and time on every allocation, so only keep it on for the window
+            tracemalloc.stop()
+        stats = after.compare_to(self._before.filter_traces(ignore), "lineno")[:limit]
+        return [
+            {"site": str(stat.traceback[0]), "size_diff_kb": round(stat.size_diff / 1024, 1), "count_diff": stat.count_diff, "size_kb": round(stat.size / 1024, 1)}
+            for stat in stats
+        ]
@@ -0,0 +1,43 @@
+class ProviderRegistry:
+    """Model name -> provider class, resolved with one dict lookup.
+
+    Providers are only constructed the first time one of their models is requested, so a
+    provider that is never used never needs its API key or client.
+    """
+
+    def __init__(self, chat_controller):
+        self.chat_controller = chat_controller
+        self.default = None
+        self.models = []
+        self._classes = {}
+        self._providers = {}
+
+    def register(self, provider_class, aliases=()):
+        model = provider_class.get_model()
+        for name in (model.model, *aliases):
+            if name in self._classes:
+                raise ValueError(f"Model name {name} is already registered")
+            self._classes[name] = (model.model, provider_class)
+        self.models.append(model)
+        if self.default is None:
+            self.default = model.model
+        return self
+
+    def set_default(self, model):
+        if model not in self._classes:
+            raise ValueError(f"Unknown default model {model}")
+        self.default = model
+
+    def alias(self, name, model):
+        if model not in self._classes:
+            raise ValueError(f"Unknown model {model}")
+        self._classes[name] = self._classes[model]
+
+    def resolve(self, name):
+        """Returns (canonical model name, provider); unknown or missing names get the default."""
+        entry = self._classes.get(name) or self._classes[self.default]
+        model, provider_class = entry
+        provider = self._providers.get(provider_class)
+        if provider is None:
+            provider = self._providers[provider_class] = provider_class(self.chat_controller)
+        return model, provider
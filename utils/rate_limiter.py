@@ -0,0 +1,81 @@
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+def refill(tokens, updated_at, now, rate, burst, cost=1):
+    """Token-bucket step shared by every backend: returns (tokens left, seconds to wait)."""
+    tokens = min(burst, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+class RateLimiter:
+    """Token buckets refilled at `rate` tokens per second up to `burst`, one bucket per key.
+
+    Buckets live in this process unless a session store is given, in which case every worker
+    pointed at the same store shares them. If the store fails, the local buckets take over.
+    """
+
+    def __init__(self, name, rate, burst, store=None, max_keys=100000):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.store = store
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    def _take_local(self, key, now):
+        tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+        tokens, wait = refill(tokens, updated_at, now, self.rate, self.burst)
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def take(self, key):
+        """Returns 0 when the request may proceed, otherwise the seconds until it may."""
+        key = f"ratelimit:{self.name}:{key}"
+        now = time.time()
+        wait = None
+        if self.store is not None:
+            try:
+                wait = await self.store.take_token(key, self.rate, self.burst, now)
+            except Exception as e:
+                logger.warning("Rate limit store error: %s", e, extra={"sample_rate": 0.01})
+        if wait is None:
+            wait = self._take_local(key, now)
+        if wait > 0:
+            self.rejected += 1
+        else:
+            self.allowed += 1
+        return wait
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "shared": self.store is not None,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "local_keys": len(self._buckets),
+        }
+
+async def enforce(*checks):
+    """Takes a token from every (limiter, key) pair and raises 429 if any bucket is empty."""
+    wait = 0.0
+    for limiter, key in checks:
+        wait = max(wait, await limiter.take(key))
+    if wait > 0:
+        raise HTTPException(status_code=429, detail="Too many attempts. Try again later.", headers={"Retry-After": str(math.ceil(wait))})
+
+def limiter_from_env(name, per_minute, burst, store):
+    per_minute = float(os.environ.get(f"{name.upper()}_RATE_PER_MINUTE", per_minute))
+    burst = float(os.environ.get(f"{name.upper()}_RATE_BURST", burst))
+    return RateLimiter(name, per_minute / 60.0, burst, store=store)
@@ -0,0 +1,79 @@
+import asyncio
+import itertools
+import time
+from sqlalchemy import text
+
+# Seconds since the replica last replayed a transaction from the primary. A replica that has
+# replayed everything it received is caught up, however long the primary has been idle.
+POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class Replica:
+
+    def __init__(self, name, engine, sessionmaker, metrics):
+        self.name = name
+        self.engine = engine
+        self.Session = sessionmaker
+        self.metrics = metrics
+        self.healthy = True
+        self.lag = 0.0
+        self.checked_at = 0.0
+        self.last_error = None
+        self._lock = asyncio.Lock()
+
+    def stale(self, interval):
+        return time.monotonic() - self.checked_at > interval and not self._lock.locked()
+
+    async def check(self, timeout):
+        async with self._lock:
+            try:
+                # The connect is inside the timeout too: a down replica can otherwise hold the
+                # request that triggered the check for the driver's full connect timeout
+                lag = await asyncio.wait_for(self.measure_lag(), timeout)
+                self.lag = float(lag or 0)
+                self.healthy = True
+                self.last_error = None
+            except Exception as e:
+                self.healthy = False
+                self.last_error = str(e)
+            self.checked_at = time.monotonic()
+
+    async def measure_lag(self):
+        async with self.engine.connect() as connection:
+            if connection.dialect.name == "postgresql":
+                return await connection.scalar(POSTGRES_LAG_SQL)
+            await connection.execute(text("SELECT 1"))
+            return 0
+
+class ReplicaRouter:
+    """Round-robin over read replicas, skipping ones that fail their health check or lag too far."""
+
+    def __init__(self, replicas, check_interval=5.0, max_lag=5.0, check_timeout=2.0):
+        self.replicas = replicas
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.check_timeout = check_timeout
+        self._next = itertools.cycle(range(len(replicas))) if replicas else None
+
+    def usable(self, replica):
+        return replica.healthy and replica.lag <= self.max_lag
+
+    async def pick(self):
+        if not self.replicas:
+            return None
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._next)]
+            # Health is refreshed lazily by whichever request finds it stale; others use the last result
+            if replica.stale(self.check_interval):
+                await replica.check(self.check_timeout)
+            if self.usable(replica):
+                return replica
+        return None
+
+    def stats(self):
+        return [
+            {"name": replica.name, "healthy": replica.healthy, "lag_seconds": replica.lag, "last_error": replica.last_error}
+            for replica in self.replicas
+        ]
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import importlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from utils.completion_cache import normalize_messages
+from utils.metrics import registry
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+semantic_requests = registry.counter("semantic_cache_requests_total", "Semantic cache lookups by model and result (hit or miss).", ("model", "result"))
+semantic_similarity = registry.histogram("semantic_cache_similarity", "Similarity of the nearest cached question on each lookup; use it to tune SEMANTIC_CACHE_THRESHOLD.", ("model",), buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0))
+semantic_entries = registry.gauge("semantic_cache_entries", "Answers held in the semantic cache.").labels()
+
+# With "auto", caches at least this large use the LSH index instead of scanning every entry
+ANN_MIN_SIZE = 50000
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def hashing_embedding(texts, dim=1024):
+    """Default embedding: words, word pairs and character trigrams hashed into `dim` signed buckets.
+    It is lexical (rewordings that share few words score low) but needs no model or download."""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = TOKEN_PATTERN.findall(text.lower())
+        features = [(word, 1.0) for word in words]
+        features += [(f"{first} {second}", 1.0) for first, second in zip(words, words[1:])]
+        features += [(f"<{word}>"[i:i + 3], 0.5) for word in words for i in range(len(word))]
+        for feature, weight in features:
+            value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+            vectors[row, value % dim] += weight if value >> 63 else -weight
+    return vectors
+
+def load_embedding(path):
+    """"package.module:function"; the function takes a list of texts and returns one vector per text."""
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+def scope_key(model, messages, stream, tools=(), sampling=None):
+    # Everything but the wording of the final question has to match exactly
+    *history, question = normalize_messages(messages)
+    document = {
+        "model": model,
+        "history": history,
+        "files": question["files"],
+        "stream": stream,
+        "tools": sorted(tools),
+        "sampling": sampling or {},
+    }
+    digest = hashlib.sha256(json.dumps(document, sort_keys=True, separators=(",", ":")).encode()).digest()
+    return int.from_bytes(digest[:8], "little", signed=True)
+
+class ExactIndex:
+    """Fixed number of slots holding unit vectors; a search scores the query against every slot
+    with one matrix-vector product and keeps the best used slot in the same scope."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.vectors = None
+        self.scopes = np.zeros(capacity, dtype=np.int64)
+        self.used = np.zeros(capacity, dtype=bool)
+
+    def add(self, slot, vector, scope):
+        if self.vectors is None:
+            # The dimension is only known once the first vector has been embedded
+            self.vectors = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+        self.vectors[slot] = vector
+        self.scopes[slot] = scope
+        self.used[slot] = True
+
+    def remove(self, slot):
+        self.used[slot] = False
+
+    def search(self, vector, scope):
+        """Returns (slot, similarity) of the nearest vector in `scope`, or (None, 0.0)."""
+        if self.vectors is None:
+            return None, 0.0
+        # Scoring every row and masking afterwards avoids copying the matching rows out first
+        scores = self.vectors @ vector
+        scores[~(self.used & (self.scopes == scope))] = -np.inf
+        best = int(np.argmax(scores))
+        return (best, float(scores[best])) if np.isfinite(scores[best]) else (None, 0.0)
+
+class LSHIndex(ExactIndex):
+    """Random-hyperplane LSH: each table buckets vectors by the signs of `bits` projections, and
+    only vectors sharing a bucket with the query in some table are scored. Much faster than a
+    full scan on large caches, at the cost of occasionally missing the true nearest neighbour."""
+
+    def __init__(self, capacity, tables=8, bits=12, seed=0):
+        super().__init__(capacity)
+        self.tables = tables
+        self.bits = bits
+        self.seed = seed
+        self.planes = None
+        self.buckets = [{} for _ in range(tables)]
+        self.signatures = {}
+
+    def _signatures(self, vector):
+        if self.planes is None:
+            rng = np.random.default_rng(self.seed)
+            self.planes = rng.standard_normal((self.tables, self.bits, len(vector))).astype(np.float32)
+        bits = (self.planes @ vector) > 0
+        return (bits @ (1 << np.arange(self.bits))).tolist()
+
+    def add(self, slot, vector, scope):
+        super().add(slot, vector, scope)
+        signatures = self.signatures[slot] = self._signatures(vector)
+        for table, signature in zip(self.buckets, signatures):
+            table.setdefault((scope, signature), set()).add(slot)
+
+    def remove(self, slot):
+        super().remove(slot)
+        signatures = self.signatures.pop(slot, None)
+        if signatures is None:
+            return
+        scope = int(self.scopes[slot])
+        for table, signature in zip(self.buckets, signatures):
+            bucket = table.get((scope, signature))
+            if bucket is not None:
+                bucket.discard(slot)
+                if not bucket:
+                    del table[(scope, signature)]
+
+    def search(self, vector, scope):
+        if self.vectors is None:
+            return None, 0.0
+        candidates = set()
+        for table, signature in zip(self.buckets, self._signatures(vector)):
+            candidates.update(table.get((scope, signature), ()))
+        if not candidates:
+            return None, 0.0
+        slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        scores = self.vectors[slots] @ vector
+        best = int(np.argmax(scores))
+        return int(slots[best]), float(scores[best])
+
+class SemanticQuery:
+    """A prepared lookup: the conversation's scope and the embedded final question."""
+
+    def __init__(self, model, scope, vector):
+        self.model = model
+        self.scope = scope
+        self.vector = vector
+
+class SemanticCache:
+    """Answers a conversation with the cached reply to the most similar earlier final user message,
+    when the rest of the conversation, the model and its parameters match exactly and the
+    similarity is at least `threshold`. Holds `max_size` entries; the oldest are replaced first.
+    Entries use the completion cache's format."""
+
+    def __init__(self, models=(), embed=None, threshold=0.9, max_size=10000, ttl=3600.0, index="auto"):
+        self.models = set(models)
+        self.embed = embed or hashing_embedding
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.index = None
+        if self.models:
+            self.index = LSHIndex(max_size) if index == "lsh" or (index == "auto" and max_size >= ANN_MIN_SIZE) else ExactIndex(max_size)
+        self._values = [None] * max_size
+        self._expires = [0.0] * max_size
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def enabled_for(self, model):
+        return model in self.models
+
+    async def lookup(self, model, messages, stream, tools=(), sampling=None):
+        """Returns (cached entry or None, query). Pass the query to put() to store the reply; it is
+        None when the conversation doesn't end with a user message and can't be cached."""
+        if not messages or messages[-1].role != "user":
+            return None, None
+        scope = scope_key(model, messages, stream, tools, sampling)
+        # Embedding and the index scan are CPU work; NumPy releases the GIL for the heavy parts
+        return await asyncio.to_thread(self._lookup, model, scope, messages[-1].content)
+
+    def _lookup(self, model, scope, text):
+        vector = np.asarray(self.embed([text]), dtype=np.float32)[0]
+        norm = np.linalg.norm(vector)
+        query = SemanticQuery(model, scope, vector / norm if norm else vector)
+        with self._lock:
+            slot, similarity = self.index.search(query.vector, scope)
+            value = None
+            if slot is not None and similarity >= self.threshold:
+                if self._expires[slot] > time.time():
+                    value = self._values[slot]
+                else:
+                    self._evict(slot)
+        if slot is not None:
+            semantic_similarity.labels(model=model).observe(similarity)
+        semantic_requests.labels(model=model, result="miss" if value is None else "hit").inc()
+        return value, query
+
+    async def put(self, query, value):
+        # The lock can be held by a lookup scanning the whole index, so wait for it off the loop
+        await asyncio.to_thread(self._put, query, value)
+
+    def _put(self, query, value):
+        with self._lock:
+            slot = self._next
+            self._next = (slot + 1) % self.max_size
+            if self._values[slot] is not None:
+                self._evict(slot)
+            self.index.add(slot, query.vector, query.scope)
+            self._values[slot] = value
+            self._expires[slot] = time.time() + self.ttl
+            self._size += 1
+            semantic_entries.set(self._size)
+
+    def _evict(self, slot):
+        self.index.remove(slot)
+        self._values[slot] = None
+        self._size -= 1
+        semantic_entries.set(self._size)
+
+def semantic_cache_from_env():
+    models = [model.strip() for model in os.environ.get("SEMANTIC_CACHE_MODELS", "").split(",") if model.strip()]
+    if models and np is None:
+        logger.warning("SEMANTIC_CACHE_MODELS is set but numpy is not installed; the semantic cache is disabled")
+        models = []
+    embedder = os.environ.get("SEMANTIC_CACHE_EMBEDDER")
+    return SemanticCache(
+        models=models,
+        embed=load_embedding(embedder) if embedder and models else None,
+        threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+        max_size=int(os.environ.get("SEMANTIC_CACHE_SIZE", "10000")),
+        ttl=float(os.environ.get("SEMANTIC_CACHE_TTL", "3600")),
+        index=os.environ.get("SEMANTIC_CACHE_INDEX", "auto"),
+    )
+
+semantic_cache = semantic_cache_from_env()
@@ -0,0 +1,248 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+from utils.rate_limiter import refill
+
+class SessionStore:
+    """Key/value store with per-key TTL shared by the workers that point at the same backend."""
+
+    async def get(self, key):
+        raise NotImplementedError
+
+    async def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    async def delete(self, key):
+        raise NotImplementedError
+
+    async def take_token(self, key, rate, burst, now):
+        """Atomically takes one token from the bucket at `key`; returns the seconds to wait, 0 if taken."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class MemorySessionStore(SessionStore):
+    """Process-local backend, the default and the stand-in for tests. Expired keys are swept every
+    `sweep_interval` writes, and past `max_entries` the keys written longest ago are dropped."""
+
+    def __init__(self, max_entries=100000, sweep_interval=1000):
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._entries = OrderedDict()
+        self._writes = 0
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        return value
+
+    async def set(self, key, value, ttl):
+        now = time.time()
+        self._entries[key] = (value, now + ttl)
+        self._entries.move_to_end(key)
+        self._writes += 1
+        if self._writes % self.sweep_interval == 0:
+            # Keys that are never read again would otherwise stay forever, e.g. rate limit buckets
+            self._entries = OrderedDict((key, entry) for key, entry in self._entries.items() if entry[1] > now)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key):
+        self._entries.pop(key, None)
+
+    async def take_token(self, key, rate, burst, now):
+        tokens, updated_at = (await self.get(key)) or (burst, now)
+        tokens, wait = refill(tokens, updated_at, now, rate, burst)
+        # A bucket left alone for burst / rate seconds is full again, same as a missing one
+        await self.set(key, (tokens, now), burst / rate)
+        return wait
+
+class SQLiteSessionStore(SessionStore):
+    """File-backed store for several workers on the same host. Expired rows are deleted every
+    `sweep_interval` writes."""
+
+    def __init__(self, path, sweep_interval=1000):
+        self.sweep_interval = sweep_interval
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS session_store (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def _execute(self, sql, params):
+        with self._lock:
+            return self._connection.execute(sql, params).fetchone()
+
+    def _write(self, sql, params):
+        with self._lock:
+            self._connection.execute(sql, params)
+            self._sweep()
+
+    def _sweep(self):
+        # Called with the lock held. Reads skip expired rows, but keys that are never read again
+        # (rate limit buckets, abandoned tokens) would otherwise stay in the file forever
+        self._writes += 1
+        if self._writes % self.sweep_interval == 0:
+            self._connection.execute("DELETE FROM session_store WHERE expires_at <= ?", (time.time(),))
+
+    async def get(self, key):
+        row = await asyncio.to_thread(self._execute, "SELECT value FROM session_store WHERE key = ? AND expires_at > ?", (key, time.time()))
+        return row[0] if row else None
+
+    async def set(self, key, value, ttl):
+        await asyncio.to_thread(self._write, "INSERT OR REPLACE INTO session_store (key, value, expires_at) VALUES (?, ?, ?)", (key, value, time.time() + ttl))
+
+    async def delete(self, key):
+        await asyncio.to_thread(self._execute, "DELETE FROM session_store WHERE key = ?", (key,))
+
+    def _take_token(self, key, rate, burst, now):
+        with self._lock:
+            # IMMEDIATE takes the write lock up front so workers cannot interleave read and write
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute("SELECT value FROM session_store WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+                tokens, updated_at = map(float, row[0].split(":")) if row else (burst, now)
+                tokens, wait = refill(tokens, updated_at, now, rate, burst)
+                self._connection.execute("INSERT OR REPLACE INTO session_store (key, value, expires_at) VALUES (?, ?, ?)", (key, f"{tokens}:{now}", now + burst / rate))
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._sweep()
+        return wait
+
+    async def take_token(self, key, rate, burst, now):
+        return await asyncio.to_thread(self._take_token, key, rate, burst, now)
+
+    async def close(self):
+        self._connection.close()
+
+class RedisError(Exception):
+    pass
+
+# Same arithmetic as utils.rate_limiter.refill, run server-side so concurrent workers cannot race
+TAKE_TOKEN_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+class RedisSessionStore(SessionStore):
+    """Minimal RESP client for Redis-compatible servers, one connection used a command at a time."""
+
+    def __init__(self, host="localhost", port=6379, db=0, password=None, timeout=1.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        if self.password:
+            await self._roundtrip("AUTH", self.password)
+        if self.db:
+            await self._roundtrip("SELECT", str(self.db))
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        # The stream is out of sync, so treat it like a broken connection
+        raise ConnectionError(f"Unexpected reply: {line!r}")
+
+    async def _roundtrip(self, *args):
+        command = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = str(arg).encode()
+            command.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._writer.write(b"".join(command))
+        await self._writer.drain()
+        return await asyncio.wait_for(self._read_reply(), self.timeout)
+
+    async def execute(self, *args):
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await self._connect()
+                return await self._roundtrip(*args)
+            except BaseException:
+                # Any failure, cancellation included, can leave a reply unread on the connection that
+                # the next command would take as its own, so drop it and reconnect next time
+                await self._reset()
+                raise
+
+    async def _reset(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def get(self, key):
+        return await self.execute("GET", key)
+
+    async def set(self, key, value, ttl):
+        await self.execute("SET", key, value, "PX", max(int(ttl * 1000), 1))
+
+    async def delete(self, key):
+        await self.execute("DEL", key)
+
+    async def take_token(self, key, rate, burst, now):
+        # Lua numbers are truncated to integers in replies, hence the string round trip
+        return float(await self.execute("EVAL", TAKE_TOKEN_SCRIPT, 1, key, rate, burst, repr(now)))
+
+    async def close(self):
+        async with self._lock:
+            await self._reset()
+
+def create_session_store(url):
+    """memory://, sqlite:///path/to/file.db or redis://[:password@]host[:port][/db]"""
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemorySessionStore()
+    if parsed.scheme == "sqlite":
+        # Same convention as SQLAlchemy: sqlite:///relative.db, sqlite:////absolute.db
+        return SQLiteSessionStore(url[len("sqlite:///"):])
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip("/") or 0)
+        return RedisSessionStore(host=parsed.hostname or "localhost", port=parsed.port or 6379, db=db, password=parsed.password)
+    raise ValueError(f"Unsupported session store url: {url}")
+
+session_store = create_session_store(os.environ.get("SESSION_STORE_URL", "memory://"))
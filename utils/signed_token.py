@@ -0,0 +1,83 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+
+TOKEN_PREFIX = "v1"
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+class TokenSigner:
+    """HMAC-SHA256 access tokens of the form v1.<payload>.<signature>, verifiable without a database."""
+
+    def __init__(self, secret):
+        self.secret = secret.encode() if isinstance(secret, str) else secret
+
+    def _sign(self, body):
+        return _b64encode(hmac.new(self.secret, f"{TOKEN_PREFIX}.{body}".encode(), hashlib.sha256).digest())
+
+    def issue(self, user_id, email, username, expires_at):
+        payload = {
+            "uid": user_id,
+            "email": email,
+            "name": username,
+            "exp": int(expires_at.timestamp()),
+            "jti": uuid.uuid4().hex,
+        }
+        body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+        return f"{TOKEN_PREFIX}.{body}.{self._sign(body)}"
+
+    def verify(self, token):
+        """Returns the payload of a valid, unexpired token, otherwise None."""
+        try:
+            prefix, body, signature = token.split(".")
+        except ValueError:
+            return None
+        # Compared as bytes: the signature comes from a header and may hold any characters
+        if prefix != TOKEN_PREFIX or not hmac.compare_digest(signature.encode(), self._sign(body).encode()):
+            return None
+        try:
+            payload = json.loads(_b64decode(body))
+            if payload["exp"] <= time.time():
+                return None
+        except (ValueError, KeyError, TypeError):
+            return None
+        return payload
+
+def is_signed_token(token):
+    return token.startswith(f"{TOKEN_PREFIX}.")
+
+class RevocationList:
+    """Token ids revoked before they expire, kept only until their expiry."""
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._revoked = {}
+
+    def revoke(self, jti, expires_at):
+        self._revoked[jti] = expires_at
+        if len(self._revoked) > self.max_size:
+            self.prune()
+
+    def is_revoked(self, jti):
+        return jti in self._revoked
+
+    def prune(self):
+        now = time.time()
+        self._revoked = {jti: expires_at for jti, expires_at in self._revoked.items() if expires_at > now}
+        # Still over the limit: drop the ones closest to expiring on their own
+        overflow = len(self._revoked) - self.max_size
+        if overflow > 0:
+            for jti in sorted(self._revoked, key=self._revoked.get)[:overflow]:
+                del self._revoked[jti]
+
+# Signed tokens are enabled by setting ACCESS_TOKEN_SECRET; otherwise tokens stay random uuids
+token_signer = TokenSigner(os.environ["ACCESS_TOKEN_SECRET"]) if os.environ.get("ACCESS_TOKEN_SECRET") else None
+revocation_list = RevocationList()
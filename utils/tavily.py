@@ -1,6 +1,10 @@
 
+import logging
 import requests
 import os
+
+logger = logging.getLogger(__name__)
+
 def tavily_search(query):
     url = "https://api.tavily.com/search"
     api_key = os.environ["TAVILY_API_KEY"]  # Replace with your actual API key
@@ -17,7 +21,7 @@ def tavily_search(query):
         data = response.json()
         return data
     else:
-        print(f"Error: {response.status_code}")
+        logger.warning("Tavily search failed with status %s", response.status_code)
         return None
 
 if __name__ == "__main__":
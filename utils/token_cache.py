@@ -0,0 +1,96 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+class CachedUser:
+    """Detached copy of the User columns the auth path needs, safe to share across sessions."""
+
+    __slots__ = ("user_id", "email", "username", "access_token", "token_expire_date")
+
+    def __init__(self, user_id, email, username, access_token, token_expire_date):
+        self.user_id = user_id
+        self.email = email
+        self.username = username
+        self.access_token = access_token
+        self.token_expire_date = token_expire_date
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.user_id, user.email, user.username, user.access_token, user.token_expire_date)
+
+    def seconds_left(self):
+        if self.token_expire_date is None:
+            return None
+        return (self.token_expire_date - datetime.now()).total_seconds()
+
+    def to_json(self):
+        expire = self.token_expire_date.isoformat() if self.token_expire_date else None
+        return json.dumps([self.user_id, self.email, self.username, self.access_token, expire])
+
+    @classmethod
+    def from_json(cls, data):
+        user_id, email, username, access_token, expire = json.loads(data)
+        return cls(user_id, email, username, access_token, datetime.fromisoformat(expire) if expire else None)
+
+class TokenCache:
+    """LRU map of access token -> CachedUser whose entries expire after `ttl` seconds or when the token does."""
+
+    def __init__(self, max_size=10000, ttl=60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, access_token):
+        entry = self._entries.get(access_token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[access_token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(access_token)
+        self.hits += 1
+        return user
+
+    def put(self, user):
+        cached = user if isinstance(user, CachedUser) else CachedUser.from_user(user)
+        ttl = self.ttl
+        if cached.token_expire_date is not None:
+            ttl = min(ttl, cached.seconds_left())
+        if ttl > 0:
+            self._entries[cached.access_token] = (cached, time.monotonic() + ttl)
+            self._entries.move_to_end(cached.access_token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return cached
+
+    def invalidate(self, access_token):
+        if self._entries.pop(access_token, None) is not None:
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+token_cache = TokenCache(
+    max_size=int(os.environ.get("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("TOKEN_CACHE_TTL", "60")),
+)